@@ -1,21 +1,30 @@
 import streamlit as st    
 import pandas as pd
-import pyodbc
 import plotly.express as px
 import base64
-import io
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Alignment, Font
 from datetime import datetime
 import numpy as np
 from plotly import graph_objects as go
-import networkx as nx
 import scipy
-import calendar 
 import plotly.io as pio
 import datetime as dt
-from openpyxl.styles import Alignment
 import plotly.graph_objects as go
+import os
+import logging
+import hashlib
+from carga import BaseVendas, LimiteRecarga, impressao_dados, preparar_metas
+import consultas
+from conexao import PoolConexoes, carregar_config
+from cubo import CuboVendas
+from periodos import IndiceDias, rotulo_mes
+from associacoes import IndiceCestas, metricas_associacao
+from grafo import figura_associados
+from semana import DIAS_SEMANA, comparativo_semanas
+from tabelas import tabela_comparativo_html
+import planilhas
+import detalhe
+from relatorio import GeradorRelatorios
+from indicadores import FonteCubo, FonteSQL, faturamento_vs_meta, perfil_hora, projecao_mes, resumo_cards
 
 # CONFIG INICIAL
 st.set_page_config(
@@ -26,75 +35,287 @@ st.set_page_config(
 
 #====================================================================================================================================
 # CONEXÃO COM BANCO
-@st.cache_data(ttl=300)
+# Com PQ_AGREGACAO_SQL=1 as seções são calculadas por GROUP BY no banco e PQ_VENDAS não é carregada inteira
+AGREGACAO_SQL = os.environ.get("PQ_AGREGACAO_SQL") == "1"
+DIALETO = os.environ.get("PQ_DIALETO", "mssql")  # "sqlite" para uma base local de teste
+
+# Credenciais em .streamlit/secrets.toml, seção [banco] (ver secrets.toml.example)
+# Sem o arquivo vale só PQ_DB_*: acessar st.secrets sem secrets.toml mostra um erro na página
+def segredos_banco():
+    if not st.secrets.load_if_toml_exists():
+        return {}
+    return dict(st.secrets.get("banco", {}))
+
+# Pool único para todas as sessões: conexões validadas antes do uso e reabertas após falha
+@st.cache_resource
+def pool_conexoes():
+    return PoolConexoes(carregar_config(segredos_banco()))
+
+# Histórico compartilhado entre sessões. Na partida os dados já limpos vêm do snapshot local (sem
+# snapshot, de uma carga completa); daí em diante uma thread busca as vendas novas a cada
+# PQ_INTERVALO_ATUALIZACAO segundos e troca os dados de uma vez. Enquanto a carga roda as sessões
+# seguem com a versão anterior: nenhuma interação espera pelo banco.
+# Vários processos (réplicas) na mesma máquina com o mesmo PQ_SNAPSHOT_DIR dividem as cargas:
+# um carrega do banco e grava uma nova geração no diretório, os outros a adotam (carga.BaseVendas).
+# "Recarregar Dados" força uma carga completa no máximo a cada PQ_INTERVALO_RECARGA segundos para todo o
+# processo; cliques nesse intervalo (de qualquer sessão) são absorvidos pela recarga já pedida.
+DIR_SNAPSHOT = os.environ.get("PQ_SNAPSHOT_DIR", "snapshot")
+INTERVALO_ATUALIZACAO = float(os.environ.get("PQ_INTERVALO_ATUALIZACAO", "300"))
+INTERVALO_RECARGA = float(os.environ.get("PQ_INTERVALO_RECARGA", "60"))
+
+@st.cache_resource
+def base_vendas():
+    base = BaseVendas(dir_snapshot=DIR_SNAPSHOT, intervalo_recarga=INTERVALO_RECARGA)
+    base.restaurar_snapshot()
+    return base
+
 def carregar_dados():
-    conn = pyodbc.connect(
-        'DRIVER={ODBC Driver 17 for SQL Server};'
-        'SERVER=sx-global.database.windows.net;'
-        'DATABASE=sx_comercial;'
-        'UID=paulo.ferraz;'
-        'PWD=Gs!^42j$G0f0^EI#ZjRv'
-    )
-    df_vendas = pd.read_sql("SELECT * FROM PQ_VENDAS", conn)
-    df_metas = pd.read_sql("SELECT * FROM PQ_METAS", conn)
-    conn.close()
-    return df_vendas, df_metas
+    base = base_vendas()
+    executar = pool_conexoes().executar
+    if base.vendas is None:
+        # Partida sem snapshot: a única carga que uma sessão espera (ou a de outro processo, se acabou de gravar)
+        executar(lambda conn: base.atualizar(conn, idade_maxima=INTERVALO_ATUALIZACAO))
+    # Já rodando: não faz nada. Vindo do snapshot, a primeira atualização começa na hora.
+    base.iniciar_atualizacao_periodica(executar, INTERVALO_ATUALIZACAO, ao_concluir=lambda: preparar_versao(base),
+                                       imediata=base.origem == "snapshot")
+    return base.estado()
+
+# Roda na thread de atualização: cubo e índices da versão nova ficam prontos antes da próxima interação,
+# e os recortes por filtro das versões anteriores saem dos caches (e da memória) de uma vez.
+# Fora da thread de uma sessão as funções em cache não usam spinner e o aviso "missing ScriptRunContext"
+# que o Streamlit registra a cada gravação no cache é esperado; só ele é filtrado do log.
+class SemAvisoContexto(logging.Filter):
+    def filter(self, registro):
+        return not (registro.threadName == "atualiza-vendas" and "missing ScriptRunContext" in registro.getMessage())
+
+logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").addFilter(SemAvisoContexto())
+
+def preparar_versao(base):
+    vendas, _, versao = base.estado()
+    for recortes in (filtrar_dados, carregar_coocorrencia, linhas_detalhe, exportar_detalhe):
+        recortes.clear()
+    carregar_cubo(versao, vendas)
+    carregar_indice_dias(versao, vendas)
+    carregar_indice_cestas(versao, vendas)
+
+# Cubo montado uma vez por versão dos dados (o DataFrame fica fora da chave do cache) e
+# compartilhado entre as sessões sem cópia: filtrar/agregar devolvem objetos novos, nunca o alteram.
+# PQ_CONTAGEM=hll troca a contagem exata de vendas por HyperLogLog com erro PQ_ERRO_HLL.
+MODO_CONTAGEM = os.environ.get("PQ_CONTAGEM", "exato")
+ERRO_HLL = float(os.environ.get("PQ_ERRO_HLL", "0.02"))
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_cubo(versao, _vendas):
+    return CuboVendas.montar(_vendas, modo_contagem=MODO_CONTAGEM, erro_hll=ERRO_HLL)
+
+# Início de cada dia nas vendas (mantidas em ordem de DATA/UN pela carga): períodos viram fatias
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_indice_dias(versao, _vendas):
+    return IndiceDias(_vendas["DATA"])
+
+# Índice de cestas (venda x produto) por versão e coocorrência por filtro do sidebar.
+# Somente leitura: ficam em cache_resource para não serem copiados a cada rerun.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_indice_cestas(versao, _vendas):
+    return IndiceCestas.montar(_vendas)
+
+@st.cache_resource(max_entries=8)
+def carregar_coocorrencia(versao, data_ini, data_fim, uns, _indice):
+    return _indice.filtrar(data_ini, data_fim, uns)
+
+# Figura do grafo memoizada pelo produto e pela lista de relacionados.
+# PQ_LAYOUT_GRAFO=spring volta ao layout do networkx (padrão: radial, sem networkx).
+LAYOUT_GRAFO = os.environ.get("PQ_LAYOUT_GRAFO", "radial")
+
+@st.cache_data(max_entries=64)
+def grafo_associados(produto, relacionados, pcts):
+    return figura_associados(produto, list(relacionados), list(pcts), layout=LAYOUT_GRAFO)
+
+# Resultado de uma consulta agregada de consultas.py, cacheado pelos parâmetros (período, UNs, meses...),
+# pela versão das recargas forçadas e pela impressão digital do banco (carga.impressao_dados).
+# A impressão é conferida no máximo a cada 5 min: sem venda nova, vencer o prazo custa só essa
+# consulta de uma linha. Recarregar só troca a versão, sem limpar os outros caches
+@st.cache_resource
+def recargas_sql():
+    return LimiteRecarga(INTERVALO_RECARGA)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def impressao_sql(versao):
+    return tuple(pool_conexoes().executar(impressao_dados))
+
+@st.cache_data(max_entries=256)
+def consultar_versao(versao, impressao, nome, *args, **kwargs):
+    return pool_conexoes().executar(getattr(consultas, nome), *args, dialeto=DIALETO, **kwargs)
+
+# (versão das recargas, impressão): também chave dos caches montados sobre as consultas
+def versao_consultas():
+    versao = recargas_sql().versao
+    return versao, impressao_sql(versao)
+
+def consultar(nome, *args, **kwargs):
+    return consultar_versao(*versao_consultas(), nome, *args, **kwargs)
+
+#====================================================================================================================================
+# FRAGMENTOS
+# Seções com widgets próprios (produto, datas da análise por hora, meses dos comparativos, botões
+# de Excel) rodam como fragmentos: mexer num desses widgets reexecuta só a própria seção, com os
+# dados e filtros da última execução completa. Filtros do sidebar continuam rodando a página toda.
+fragmento = getattr(st, "fragment", None) or st.experimental_fragment
 
 #====================================================================================================================================
 # SIDEBAR
-def montar_sidebar(df, todas_uns):
+# Idade dos dados em uso e avisos da carga (falha na última atualização, vendas com DATA inválida)
+def situacao_dados(base):
+    idade = int((datetime.now() - base.carregado_em).total_seconds() // 60)
+    conferidos = f" · sem mudanças no banco às {base.conferido_em:%H:%M}" if base.conferido_em != base.carregado_em else ""
+    st.sidebar.caption(f"🕒 Dados de {base.carregado_em:%d/%m/%Y %H:%M} (há {idade} min){conferidos} · geração {base.versao}")
+    if base.erro_atualizacao is not None:
+        st.sidebar.warning(f"⚠️ Falha ao atualizar às {base.falhou_em:%H:%M}: {base.erro_atualizacao}. "
+                           "Exibindo os últimos dados carregados.")
+    if base.datas_invalidas:
+        st.sidebar.warning(f"⚠️ {base.datas_invalidas:,} linha(s) de PQ_VENDAS com DATA inválida ficaram fora da carga.".replace(",", "."))
+
+CHAVES_FILTROS = [
+    "filtro_data_ini", "filtro_data_fim", "filtro_uns", "filtro_produto", "filtro_hora_ini", "filtro_hora_fim",
+    "meses_faturamento", "meses_qtd_venda", "meses_ticket_medio",
+    "detalhe_produto", "detalhe_hora", "detalhe_ordem", "detalhe_decrescente", "detalhe_pagina",
+]
+
+def montar_sidebar(data_min, data_max, todas_uns):
     st.sidebar.markdown("## ⚙️ Painel de Controles")
 
     # Botão de recarregar
     if st.sidebar.button("🔄 Recarregar Dados", help="Atualiza os dados diretamente do banco"):
-        st.cache_data.clear()
-        st.experimental_rerun()
+        recargas = recargas_sql() if AGREGACAO_SQL else base_vendas().recargas
+        if AGREGACAO_SQL and recargas.pedir():
+            st.rerun()  # nova versão das consultas: os resultados das versões anteriores deixam de ser usados
+        elif not AGREGACAO_SQL and base_vendas().recarregar():
+            # Recarga completa (sem watermark) em segundo plano; os dados atuais seguem em uso até ela terminar
+            st.sidebar.info("🔄 Recarga iniciada: os dados novos aparecem na próxima interação após a carga.")
+        else:
+            st.sidebar.info(f"🔄 Recarga pedida há pouco; a próxima fica liberada em {recargas.espera():.0f} s.")
+
+    if not AGREGACAO_SQL:
+        situacao_dados(base_vendas())
 
     st.sidebar.markdown("---")
 
     # Filtro de período
-    data_ini = st.sidebar.date_input("📆 Data Início", value=df["DATA"].min())
-    data_fim = st.sidebar.date_input("📆 Data Fim", value=df["DATA"].max())
+    data_ini = st.sidebar.date_input("📆 Data Início", value=data_min, key="filtro_data_ini")
+    data_fim = st.sidebar.date_input("📆 Data Fim", value=data_max, key="filtro_data_fim")
 
     # Filtro de unidade
-    un_selecionadas = st.sidebar.multiselect("🏬 Unidades:", todas_uns, default=todas_uns)
+    un_selecionadas = st.sidebar.multiselect("🏬 Unidades:", todas_uns, default=todas_uns, key="filtro_uns")
 
     st.sidebar.markdown("---")
     
-    # Limpar filtros
+    # Limpar filtros: só os filtros desta sessão (arquivos já gerados e o resto do estado ficam)
     if st.sidebar.button("🧹 Limpar Filtros"):
-        st.session_state.clear()
-        st.experimental_rerun()
+        for chave in CHAVES_FILTROS:
+            st.session_state.pop(chave, None)
+        st.rerun()
 
     return data_ini, data_fim, un_selecionadas
 
 #====================================================================================================================================
-
-
+# AGREGAÇÕES POR SEÇÃO
+# Cada seção consome um resultado agregado pequeno: somado a partir do cubo já filtrado
+# (cubo_filt) ou, no modo AGREGACAO_SQL, direto do banco com o período e as UNs do sidebar como parâmetros.
+def filtro_sql():
+    return data_ini, data_fim, tuple(un_selecionadas)
+
+def agg_totais():
+    if AGREGACAO_SQL:
+        df_tot = consultar("totais", *filtro_sql())
+        return float(df_tot["TOTAL"].iloc[0]), int(df_tot["QTD_VENDAS"].iloc[0])
+    return cubo_filt.horas["TOTAL"].sum(), cubo_filt.total_vendas()
+
+def agg_mes_un():
+    if AGREGACAO_SQL:
+        return consultar("faturamento_mes_un", *filtro_sql())
+    return cubo_filt.agregar(["MES", "UN"])
+
+# n=None: todos os produtos, em ordem de faturamento
+def agg_produtos(n=10):
+    if AGREGACAO_SQL:
+        return consultar("totais_produto", *filtro_sql(), n=n)
+    df_prod = cubo_filt.celulas.groupby("DESCRICAO_PRODUTO", observed=True)["TOTAL"].sum().reset_index()
+    df_prod = df_prod.sort_values("TOTAL", ascending=False)
+    return df_prod if n is None else df_prod.head(n)
+
+# (PRODUTO, FREQ, VENDAS_PRODUTO), vendas com o produto, total de vendas no filtro
+def agg_associados(produto, n=5):
+    if AGREGACAO_SQL:
+        return consultar("produtos_associados", *filtro_sql(), produto, n=n)
+    return carregar_coocorrencia(versao_dados, *filtro_sql(), indice_cestas).relacionados(produto, n)
+
+def agg_limites():
+    if AGREGACAO_SQL:
+        return consultar("limites", *filtro_sql())
+    return cubo_filt.horas["DIA"].min(), cubo_filt.horas["DIA"].max()
+
+def agg_dia_hora(inicio, fim):
+    if AGREGACAO_SQL:
+        return consultar("vendas_dia_hora", inicio, fim, tuple(un_selecionadas))
+    return cubo_filt.agregar(["DIA", "HORA"], cubo_filt.horas_periodo(inicio, fim))
+
+# SEMANA: chave inteira da semana (periodos.py); DIA_SEMANA: 0 = segunda-feira
+def agg_semana_dia(meses):
+    if AGREGACAO_SQL:
+        return consultar("vendas_semana_dia", *filtro_sql(), tuple(meses))
+    horas = cubo_filt.horas[cubo_filt.horas["MES"].isin(meses)]
+    return cubo_filt.agregar(["SEMANA", "DIA_SEMANA"], horas)
+
+# As três métricas por dia da semana de uma seleção de meses, calculadas uma vez por
+# versão dos dados + filtro do sidebar + meses (seções com os mesmos meses reaproveitam)
+@st.cache_data(max_entries=32)
+def comparativo_dias_semana(versao, filtro, meses):
+    return comparativo_semanas(agg_semana_dia(list(meses)))
+
+# Filtros do sidebar aplicados uma vez por versão dos dados + período + UNs (LRU de 16 combinações,
+# esvaziado quando chega uma versão nova: ver preparar_versao).
+# cache_resource devolve os mesmos objetos a cada rerun, sem cópia: quem consome não deve alterá-los.
+@st.cache_resource(max_entries=16)
+def filtrar_dados(versao, data_ini, data_fim, uns, _df, _metas, _cubo, _dias):
+    cubo_filt = _cubo.filtrar(data_ini, data_fim, list(uns))
+    df_filt = _df.iloc[_dias.fatia(data_ini, data_fim)]
+    if not set(_df["UN"].cat.categories) <= set(uns):
+        df_filt = df_filt[df_filt["UN"].isin(uns)]
+    df_mes_un = cubo_filt.agregar(["MES", "UN"])
+    meses = sorted(df_mes_un["MES"].unique())
+    metas_filt = _metas[_metas["LOJA"].isin(uns) & _metas["MES"].isin(meses)]
+    return cubo_filt, df_filt, df_mes_un, meses, metas_filt
 
 #====================================================================================================================================
 # CARGA E PREPARO
 with st.spinner("🔄 Carregando dados..."):
-    df, metas = carregar_dados()
-
-# Limpeza e padronização
-df.columns = df.columns.str.strip().str.upper()
-metas.columns = metas.columns.str.strip().str.upper()
-
-df["DATA"] = pd.to_datetime(df["DATA"], dayfirst=True, errors="coerce")
-df = df.dropna(subset=["DATA"])
-df["ANO_MES"] = df["DATA"].dt.to_period("M").astype(str)
-
-metas["ANO_MES"] = pd.to_datetime(metas["ANO-MES"]).dt.to_period("M").astype(str)
+    if AGREGACAO_SQL:
+        df = None
+        # Versão das consultas: os caches montados sobre elas seguem recargas e dados novos no banco
+        versao_dados = versao_consultas()
+        metas = preparar_metas(consultar("metas"))
+    else:
+        # Já chegam limpos e padronizados (DATA convertida, MES das metas calculado)
+        df, metas, versao_dados = carregar_dados()
+        cubo = carregar_cubo(versao_dados, df)
+        indice_cestas = carregar_indice_cestas(versao_dados, df)
 
 # Agora sim, define todas_uns
 todas_uns = sorted(metas["LOJA"].dropna().unique())
 
 # Sidebar com controles
-data_ini, data_fim, un_selecionadas = montar_sidebar(df, todas_uns)
-
-# Aplica o filtro de data no DataFrame principal
-df = df[(df["DATA"] >= pd.to_datetime(data_ini)) & (df["DATA"] <= pd.to_datetime(data_fim))]
+if AGREGACAO_SQL:
+    data_min, data_max = consultar("limites")
+else:
+    data_min, data_max = df["DATA"].min(), df["DATA"].max()
+data_ini, data_fim, un_selecionadas = montar_sidebar(data_min, data_max, todas_uns)
+
+# Aplica período e UNs no DataFrame principal, no cubo e nas metas (memoizado)
+if df is not None:
+    cubo_filt, df_filt, df_mes_un, meses_disponiveis, metas_filt = filtrar_dados(
+        versao_dados, data_ini, data_fim, tuple(un_selecionadas), df, metas, cubo,
+        carregar_indice_dias(versao_dados, df)
+    )
 
 
 
@@ -133,6 +354,24 @@ st.markdown("""
         .block-container {
             padding-top: 0rem;
         }
+        /* Tabelas comparativas (tabelas.py) */
+        .pq-comparativo {
+            border-collapse: collapse;
+            width: 100%;
+            text-align: center;
+        }
+        .pq-comparativo th, .pq-comparativo td {
+            padding: 6px;
+            border: 1px solid #555;
+        }
+        .pq-comparativo td.linha { font-weight: bold; }
+        .pq-comparativo td.nd { background-color: #f0f0f0; color: #111; }
+        .pq-comparativo td.alta { background-color: #CCFFCC; color: #111; }
+        .pq-comparativo td.baixa { background-color: #FFCCCC; color: #111; }
+        .pq-comparativo tr.total td { font-weight: bold; }
+        .pq-comparativo tr.total td.linha { background-color: #ddd; color: #111; }
+        .pq-comparativo .sobe { color: green; font-size: 12px; }
+        .pq-comparativo .desce { color: red; font-size: 12px; }
     </style>
 """, unsafe_allow_html=True)
 
@@ -162,14 +401,12 @@ with st.container():
 # APLICAÇÃO DOS FILTROS (vindos do sidebar)
 # ====================
 
-# Filtro de datas (já aplicado antes ao df)
-df_filt = df[df["UN"].isin(un_selecionadas)].copy()
-metas_filt = metas[metas["LOJA"].isin(un_selecionadas)].copy()
-
-# Geração automática dos meses presentes no df filtrado por data
-meses_selecionados = sorted(df_filt["ANO_MES"].unique())
-metas_filt = metas_filt[metas_filt["ANO_MES"].isin(meses_selecionados)]
-df_filt = df_filt[df_filt["ANO_MES"].isin(meses_selecionados)]
+# Modo AGREGACAO_SQL: meses presentes no período vêm do banco (no modo em memória, de filtrar_dados)
+if df is None:
+    df_filt = None
+    df_mes_un = agg_mes_un()
+    meses_disponiveis = sorted(df_mes_un["MES"].unique())
+    metas_filt = metas[metas["LOJA"].isin(un_selecionadas) & metas["MES"].isin(meses_disponiveis)]
 
 
 # ====================
@@ -181,11 +418,7 @@ col1, col2 = st.columns([1, 4.2])
 # CARDS
 #=====================================================================================================================================================================
 with col1:
-    fat_total = df_filt["TOTAL"].sum()
-    qtd_vendas = df_filt["COD_VENDA"].nunique()
-    ticket = fat_total / qtd_vendas if qtd_vendas > 0 else 0
-    meta_total = metas_filt["VALOR_META"].sum()
-    progresso = (fat_total / meta_total) * 100 if meta_total > 0 else 0
+    cards = resumo_cards(*agg_totais(), metas_filt["VALOR_META"].sum())
 
     def metric_card(titulo, valor):
         st.markdown(
@@ -206,11 +439,11 @@ with col1:
         return f"{value:,.2f}%".replace(",", "X").replace(".", ",").replace("X", ".")
 
     # Cards
-    metric_card("💰 Faturamento Total", format_brl(fat_total))
-    metric_card("🎯 Meta de Faturamento", format_brl(meta_total))
-    metric_card("📈 Progresso da Meta", format_percent(progresso))
-    metric_card("📊 Qtde de Vendas", f"{qtd_vendas:,}".replace(",", "."))
-    metric_card("💳 Ticket Médio", format_brl(ticket))
+    metric_card("💰 Faturamento Total", format_brl(cards["FATURAMENTO"]))
+    metric_card("🎯 Meta de Faturamento", format_brl(cards["META"]))
+    metric_card("📈 Progresso da Meta", format_percent(cards["PROGRESSO"]))
+    metric_card("📊 Qtde de Vendas", f"{cards['QTD_VENDAS']:,}".replace(",", "."))
+    metric_card("💳 Ticket Médio", format_brl(cards["TICKET"]))
 #=====================================================================================================================================================================
 
 
@@ -219,14 +452,8 @@ with col1:
 #=====================================================================================================================================================================
 with col2:
     with st.container(border=True):
-        # Preparação dos dados
-        df_mes = df_filt.groupby("ANO_MES")["TOTAL"].sum().reset_index()
-        df_meta_mes = metas_filt.groupby("ANO-MES")["VALOR_META"].sum().reset_index()
-        df_meta_mes.rename(columns={"ANO-MES": "ANO_MES"}, inplace=True)
-
-        # Merge mantendo todos os meses da meta (mesmo se não houve venda)
-        df_merged = pd.merge(df_meta_mes, df_mes, on="ANO_MES", how="left").fillna(0)
-        df_merged["PCT"] = df_merged["TOTAL"] / df_merged["VALOR_META"]
+        # Preparação dos dados (todos os meses da meta, mesmo sem venda)
+        df_merged = faturamento_vs_meta(df_mes_un, metas_filt)
 
         # Gráfico de barras
         fig1 = px.bar(
@@ -324,68 +551,14 @@ with col2:
 #st.markdown("---")
 
 
-col3a, col3c, col3b = st.columns(3)  # Desempacota as colunas corretamente
-
-
 #=====================================================================================================================================================================
 # === BLOCOS DE GRÁFICOS COM CARDS INTERMEDIÁRIOS ===
-from datetime import datetime
-import calendar
-
-# Cálculos
-hoje = datetime.today()
-dia_hoje = hoje.day
-dias_no_mes = calendar.monthrange(hoje.year, hoje.month)[1]
-
-df_merge = metas_filt.copy()
-df_merge = df_merge.rename(columns={"LOJA": "UN", "VALOR_META": "VALOR_META"})
-
-df_fat = df_filt.groupby("UN")["TOTAL"].sum().reset_index()
-df_merge = pd.merge(df_merge, df_fat, on="UN", how="left").fillna(0)
-
-# Faturamento acumulado e projetado
-df_merge["FALTA_META"] = df_merge["VALOR_META"] - df_merge["TOTAL"]
-df_merge["FALTA_META"] = df_merge["FALTA_META"].apply(lambda x: max(0, x))  # evita valores negativos
-df_merge["MEDIA_DIARIA"] = df_merge["TOTAL"] / dia_hoje
-df_merge["FAT_PROJETADO"] = df_merge["MEDIA_DIARIA"] * dias_no_mes
-df_merge["PCT_PROJETADO"] = df_merge["FAT_PROJETADO"] / df_merge["VALOR_META"]
-
-# ====================
-# COLUNAS
-# ====================
-col3a, col3c, col_cards, col3b = st.columns([1.2, 1.2, 1.1, 1.2])
-
-from datetime import datetime
-import calendar
-
-# === FILTRO PARA MÊS ATUAL
-hoje = datetime.today()
-ano_mes_atual = hoje.strftime("%Y-%m")
-dia_hoje = hoje.day
-dias_no_mes = calendar.monthrange(hoje.year, hoje.month)[1]
-
-df_mes_atual = df_filt[df_filt["ANO_MES"] == ano_mes_atual].copy()
-metas_mes_atual = metas_filt[metas_filt["ANO-MES"] == ano_mes_atual].copy()
-
-# === PREPARAÇÃO DE DADOS AGRUPADOS POR UN
-df_un_fat = df_mes_atual.groupby("UN")["TOTAL"].sum().reset_index()
-df_merge = pd.merge(
-    metas_mes_atual.rename(columns={"LOJA": "UN"}),
-    df_un_fat,
-    on="UN",
-    how="left"
-).fillna(0)
-
-df_merge["FALTA_META"] = (df_merge["VALOR_META"] - df_merge["TOTAL"]).clip(lower=0)
-df_merge["MEDIA_DIARIA"] = df_merge["TOTAL"] / dia_hoje
-df_merge["FAT_PROJETADO"] = df_merge["MEDIA_DIARIA"] * dias_no_mes
-df_merge["PCT_PROJETADO"] = df_merge["FAT_PROJETADO"] / df_merge["VALOR_META"]
-
-# === CÁLCULOS PARA CARDS DO MÊS ATUAL
-fat_realizado = df_merge["TOTAL"].sum()
-meta = df_merge["VALOR_META"].sum()
-fat_proj = df_merge["FAT_PROJETADO"].sum()
-pct_proj = fat_proj / meta if meta > 0 else 0
+# Mês atual por UN: realizado, falta para a meta e projeção; cards com os totais
+df_merge, projecao = projecao_mes(df_mes_un, metas_filt, datetime.today())
+fat_realizado = projecao["FAT_REALIZADO"]
+meta = projecao["META"]
+fat_proj = projecao["FAT_PROJETADO"]
+pct_proj = projecao["PCT_PROJETADO"]
 
 # === LAYOUT EM 4 COLUNAS
 col1, col2, col_card, col3 = st.columns([1.2, 1.2, 1.1, 1.2])
@@ -471,742 +644,255 @@ with col3:
 
 
 # ANÁLISE DE PRODUTOS
-with st.container(border=True):
-    st.markdown("<h4 style='color:#862E3A;'>🏆 Top 10 Produtos e Produtos Associados</h4>", unsafe_allow_html=True)
-
-    col1, col2 = st.columns([1.2, 1.8])
-
-    # ================= COLUNA 1 - BARRAS =================
-    with col1:
-        df_top = df_filt.groupby("DESCRICAO_PRODUTO")["TOTAL"].sum().reset_index()
-        df_top = df_top.sort_values("TOTAL", ascending=False).head(10)
-        top_produtos = df_top["DESCRICAO_PRODUTO"].tolist()
-
-        produto_selecionado = st.selectbox("🧠 Selecione um produto:", top_produtos)
-
-        fig_top10 = px.bar(df_top.sort_values("TOTAL"),
-                           x="TOTAL", y="DESCRICAO_PRODUTO",
-                           orientation='h',
-                           text_auto=True,
-                           title="Top 10 Produtos",
-                           color="TOTAL", color_continuous_scale="OrRd")
-
-        fig_top10.update_layout(yaxis=dict(categoryorder="total ascending"),
-                                xaxis_tickprefix="R$ ", xaxis_tickformat=",.2f",
-                                margin=dict(t=40, l=10, r=10, b=10),
-                                title_font=dict(size=16),
-                                height=400)
-
-        st.plotly_chart(fig_top10, use_container_width=True)
-
-    # ================= COLUNA 2 - GRAFO =================
-    with col2:
-        df_assoc = df_filt[["COD_VENDA", "DESCRICAO_PRODUTO"]].drop_duplicates()
-
-        vendas_com_produto = df_assoc[df_assoc["DESCRICAO_PRODUTO"] == produto_selecionado]["COD_VENDA"].unique()
-        df_relacionados = df_assoc[df_assoc["COD_VENDA"].isin(vendas_com_produto)]
-
-        total_vendas_produto = len(vendas_com_produto)
-
-        relacionados = df_relacionados[df_relacionados["DESCRICAO_PRODUTO"] != produto_selecionado]
-        freq_relacionados = relacionados["DESCRICAO_PRODUTO"].value_counts().head(5).reset_index()
-        freq_relacionados.columns = ["PRODUTO", "FREQ"]
-        freq_relacionados["PCT"] = freq_relacionados["FREQ"] / total_vendas_produto
-
-        import networkx as nx
-        import plotly.graph_objects as go
-
-        G = nx.Graph()
-        G.add_node(produto_selecionado, size=100)
-
-        for _, row in freq_relacionados.iterrows():
-            G.add_node(row["PRODUTO"], size=row["PCT"] * 100)
-            G.add_edge(produto_selecionado, row["PRODUTO"], weight=row["PCT"])
+@fragmento
+def secao_produtos():
+    with st.container(border=True):
+        st.markdown("<h4 style='color:#862E3A;'>🏆 Top 10 Produtos e Produtos Associados</h4>", unsafe_allow_html=True)
+
+        col1, col2 = st.columns([1.2, 1.8])
+
+        # ================= COLUNA 1 - BARRAS =================
+        with col1:
+            df_produtos = agg_produtos(None)
+            df_top = df_produtos.head(10)
+
+            # Qualquer produto do período, começando pelos mais vendidos
+            produto_selecionado = st.selectbox("🧠 Selecione um produto:", df_produtos["DESCRICAO_PRODUTO"].tolist(),
+                                               key="filtro_produto")
+
+            fig_top10 = px.bar(df_top.sort_values("TOTAL"),
+                               x="TOTAL", y="DESCRICAO_PRODUTO",
+                               orientation='h',
+                               text_auto=True,
+                               title="Top 10 Produtos",
+                               color="TOTAL", color_continuous_scale="OrRd")
+
+            fig_top10.update_layout(yaxis=dict(categoryorder="total ascending"),
+                                    xaxis_tickprefix="R$ ", xaxis_tickformat=",.2f",
+                                    margin=dict(t=40, l=10, r=10, b=10),
+                                    title_font=dict(size=16),
+                                    height=400)
+
+            st.plotly_chart(fig_top10, use_container_width=True)
+
+        # ================= COLUNA 2 - GRAFO =================
+        with col2:
+            freq_relacionados, total_vendas_produto, total_vendas_filtro = agg_associados(produto_selecionado, 5)
+            freq_relacionados = metricas_associacao(freq_relacionados, total_vendas_produto, total_vendas_filtro)
+            freq_relacionados["PCT"] = freq_relacionados["CONFIANCA"]
+
+            fig_grafo = grafo_associados(
+                produto_selecionado,
+                tuple(freq_relacionados["PRODUTO"].astype(str)),
+                tuple(freq_relacionados["PCT"].astype(float))
+            )
 
-        pos = nx.spring_layout(G, seed=42, k=0.8)
+            st.plotly_chart(fig_grafo, use_container_width=True)
+
+            # Suporte: % de todas as vendas com os dois produtos; confiança: % das vendas do produto
+            # selecionado que levam o relacionado; lift > 1: compram juntos mais que o acaso
+            tabela_assoc = freq_relacionados[["PRODUTO", "FREQ", "SUPORTE", "CONFIANCA", "LIFT"]].copy()
+            tabela_assoc[["SUPORTE", "CONFIANCA"]] *= 100
+            st.dataframe(
+                tabela_assoc,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "PRODUTO": "Produto",
+                    "FREQ": st.column_config.NumberColumn("Vendas juntas", format="%d"),
+                    "SUPORTE": st.column_config.NumberColumn("Suporte", format="%.2f%%"),
+                    "CONFIANCA": st.column_config.NumberColumn("Confiança", format="%.1f%%"),
+                    "LIFT": st.column_config.NumberColumn("Lift", format="%.2f"),
+                }
+            )
 
-        edge_x, edge_y = [], []
-        for edge in G.edges():
-            x0, y0 = pos[edge[0]]
-            x1, y1 = pos[edge[1]]
-            edge_x += [x0, x1, None]
-            edge_y += [y0, y1, None]
+secao_produtos()
+
+
+# Hash das entradas de uma exportação (DataFrames e arrays pelo conteúdo)
+def assinatura_entradas(args):
+    h = hashlib.sha1()
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            h.update(repr(list(arg.columns)).encode())
+            h.update(pd.util.hash_pandas_object(arg).to_numpy().tobytes())
+        elif isinstance(arg, np.ndarray):
+            h.update(repr((arg.dtype, arg.shape)).encode())
+            h.update(np.ascontiguousarray(arg).tobytes())
+        else:
+            h.update(repr(arg).encode())
+    return h.hexdigest()
+
+# Exportação sob demanda: o arquivo só é gerado depois do clique em "Gerar ...", e os bytes
+# ficam em cache pelas entradas (gerar deve ser uma função em st.cache_data/st.cache_resource).
+# O clique vale para as entradas em que foi dado: mudou filtro ou seleção, volta o "Gerar ...".
+# assinatura: o que identifica o arquivo quando os args são grandes demais para o hash (padrão: os args)
+def botao_download(rotulo, rotulo_gerar, chave, arquivo, mime, gerar, *args, assinatura=None):
+    assinatura = assinatura_entradas(args if assinatura is None else assinatura)
+    if st.session_state.get(chave) != assinatura:
+        if not st.button(rotulo_gerar, key=f"{chave}_gerar"):
+            return
+        st.session_state[chave] = assinatura
+    st.download_button(label=rotulo, data=gerar(*args), file_name=arquivo, mime=mime)
+
+def botao_excel(rotulo, arquivo, gerar, *args):
+    botao_download(rotulo, "📄 Gerar Excel", f"excel_{arquivo}", arquivo, planilhas.MIME_XLSX, gerar, *args)
+
+# Pool de threads do relatório completo, compartilhado entre as sessões
+@st.cache_resource
+def gerador_relatorios():
+    return GeradorRelatorios(max_workers=int(os.environ.get("PQ_RELATORIO_THREADS", "4")))
+
+@st.cache_data(max_entries=16)
+def excel_por_hora(df_hora):
+    return planilhas.excel_por_hora(df_hora)
+
+@st.cache_data(max_entries=16)
+def excel_comparativo(aba, colunas, valores, variacao, totais, variacao_totais, inteiro):
+    return planilhas.excel_comparativo(aba, DIAS_SEMANA, colunas, valores, variacao, totais, variacao_totais, inteiro)
 
-        edge_trace = go.Scatter(
-            x=edge_x, y=edge_y,
-            line=dict(width=1.5, color="#A4B494"),
-            hoverinfo="none",
-            mode="lines"
+# Análise por hora.
+#===========================================================================================================================================================
+@fragmento
+def secao_por_hora():
+    with st.container(border=True):
+        st.markdown("<h4 style='color:#862E3A;'>⏰ Desempenho de Vendas por Hora (com Drill-down por Período)</h4>", unsafe_allow_html=True)
+
+        # Filtro de datas com início e fim
+        min_data, max_data = agg_limites()
+        min_data, max_data = min_data.date(), max_data.date()
+        hoje = datetime.today().date()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            data_inicio = st.date_input("📅 Data Início", value=hoje, min_value=min_data, max_value=max_data,
+                                        key="filtro_hora_ini")
+        with col2:
+            data_fim = st.date_input("📅 Data Fim", value=hoje, min_value=min_data, max_value=max_data,
+                                     key="filtro_hora_fim")
+
+        # Agrupamento por hora
+        df_hora = perfil_hora(agg_dia_hora(data_inicio, data_fim))
+        media_total = df_hora["TOTAL"].mean()
+
+        # Rótulo de dados: Faturamento + Ticket Médio
+        df_hora["LABEL"] = df_hora.apply(
+            lambda row: f"R$ {row['TOTAL']:,.2f}\n🎫 R$ {row['TICKET_MEDIO']:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+            axis=1
         )
 
-        node_x, node_y, node_text, node_size = [], [], [], []
-        for node in G.nodes():
-            x, y = pos[node]
-            node_x.append(x)
-            node_y.append(y)
-
-            if node == produto_selecionado:
-                legenda = ""
-                tamanho = 50
-                texto = f"<b>{node}</b>"
-            else:
-                pct = G[produto_selecionado][node]['weight']
-                legenda = f"em {pct:.1%} das vendas de {produto_selecionado}"
-                tamanho = 20 + pct * 100
-                texto = f"<b>{node}</b><br><span style='font-size:18px; color:#333;'>{legenda}</span>"
-            
-            node_text.append(texto)
-
-
-            
-            #if node == produto_selecionado:
-            #    legenda = "Produto Selecionado"
-            #    tamanho = 50
-            #else:
-            #    pct = G[produto_selecionado][node]['weight']
-            #    legenda = f"{pct:.1%} das vendas com {produto_selecionado}"
-            #    tamanho = 20 + pct * 100
-
-            #node_text.append(f"<b>{node}</b><br><span style='font-size:13px; color:#333;'>{legenda}</span>")
-            node_size.append(tamanho)
-
-        node_trace = go.Scatter(
-            x=node_x, y=node_y,
-            mode="markers+text",
-            hoverinfo="skip",
-            text=node_text,
-            textposition="bottom center",
-            marker=dict(
-                showscale=False,
-                color=node_size,
-                size=node_size,
-                colorscale="OrRd",
-                line_width=2
-            )
+        # Gráfico
+        fig = go.Figure()
+
+        # Barras - Faturamento
+        fig.add_trace(go.Bar(
+            x=df_hora["HORA_STR"],
+            y=df_hora["TOTAL"],
+            name="Faturamento",
+            marker_color="#FE9C37",
+            text=df_hora["LABEL"],
+            textposition="outside",
+            hovertemplate="<b>Hora:</b> %{x}<br><b>Faturamento:</b> R$ %{y:,.2f}<br><b>🎫 Ticket Médio:</b> %{text}<extra></extra>"
+        ))
+
+        # Linha - Quantidade de Vendas
+        fig.add_trace(go.Scatter(
+            x=df_hora["HORA_STR"],
+            y=df_hora["COD_VENDA"],
+            name="Qtd. Vendas",
+            mode="lines+markers",
+            marker=dict(color="#862E3A"),
+            yaxis="y2",
+            hovertemplate="Vendas: %{y}<extra></extra>"
+        ))
+
+        # Linha - Média de Faturamento
+        fig.add_trace(go.Scatter(
+            x=df_hora["HORA_STR"],
+            y=[media_total] * len(df_hora),
+            name="Média de Faturamento",
+            mode="lines",
+            line=dict(color="gray", dash="dot"),
+            hoverinfo="skip"
+        ))
+
+        fig.update_layout(
+            title="Desempenho por Hora",
+            xaxis=dict(title="Hora do Dia", showgrid=False),
+            yaxis=dict(
+                title="Faturamento (R$)",
+                tickprefix="R$ ",
+                tickformat=",.0f",
+                titlefont=dict(color="#FE9C37"),
+                showgrid=False
+            ),
+            yaxis2=dict(
+                title="Qtd. Vendas",
+                overlaying="y",
+                side="right",
+                titlefont=dict(color="#862E3A"),
+                showgrid=False
+            ),
+            legend=dict(orientation="h", y=1.02, x=0.5, xanchor="center", yanchor="bottom"),
+            height=460,
+            margin=dict(t=60, l=50, r=50, b=40)
         )
 
-        fig_grafo = go.Figure(data=[edge_trace, node_trace],
-                              layout=go.Layout(
-                                  title=dict(text=f"Produtos Relacionados a: {produto_selecionado}", font=dict(size=16)),
-                                  showlegend=False,
-                                  margin=dict(t=40, l=0, r=0, b=0),
-                                  hovermode="closest",
-                                  xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-                                  yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-                                  height=400
-                              ))
-
-        st.plotly_chart(fig_grafo, use_container_width=True)
-
+        st.plotly_chart(fig, use_container_width=True)
 
-# Análise por hora.
-#===========================================================================================================================================================
-with st.container(border=True):
-    st.markdown("<h4 style='color:#862E3A;'>⏰ Desempenho de Vendas por Hora (com Drill-down por Período)</h4>", unsafe_allow_html=True)
-
-    # Filtro de datas com início e fim
-    min_data = df_filt["DATA"].min().date()
-    max_data = df_filt["DATA"].max().date()
-    hoje = datetime.today().date()
-
-    col1, col2 = st.columns(2)
-    with col1:
-        data_inicio = st.date_input("📅 Data Início", value=hoje, min_value=min_data, max_value=max_data)
-    with col2:
-        data_fim = st.date_input("📅 Data Fim", value=hoje, min_value=min_data, max_value=max_data)
-
-    df_periodo = df_filt[(df_filt["DATA"].dt.date >= data_inicio) & (df_filt["DATA"].dt.date <= data_fim)].copy()
-
-    # Agrupamento por hora
-    df_hora = df_periodo.groupby("HORA").agg({
-        "TOTAL": "sum",
-        "COD_VENDA": "nunique"
-    }).reset_index().sort_values("HORA")
-
-    df_hora["TICKET_MEDIO"] = df_hora["TOTAL"] / df_hora["COD_VENDA"]
-    df_hora["HORA_STR"] = df_hora["HORA"].astype(str) + "h"
-    media_total = df_hora["TOTAL"].mean()
-
-    # Rótulo de dados: Faturamento + Ticket Médio
-    df_hora["LABEL"] = df_hora.apply(
-        lambda row: f"R$ {row['TOTAL']:,.2f}\n🎫 R$ {row['TICKET_MEDIO']:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-        axis=1
-    )
+        # Exportar para Excel
+        botao_excel("📥 Baixar Excel", "vendas_por_hora.xlsx", excel_por_hora,
+                    df_hora[["HORA_STR", "TOTAL", "COD_VENDA", "TICKET_MEDIO"]])
 
-    # Gráfico
-    fig = go.Figure()
-
-    # Barras - Faturamento
-    fig.add_trace(go.Bar(
-        x=df_hora["HORA_STR"],
-        y=df_hora["TOTAL"],
-        name="Faturamento",
-        marker_color="#FE9C37",
-        text=df_hora["LABEL"],
-        textposition="outside",
-        hovertemplate="<b>Hora:</b> %{x}<br><b>Faturamento:</b> R$ %{y:,.2f}<br><b>🎫 Ticket Médio:</b> %{text}<extra></extra>"
-    ))
-
-    # Linha - Quantidade de Vendas
-    fig.add_trace(go.Scatter(
-        x=df_hora["HORA_STR"],
-        y=df_hora["COD_VENDA"],
-        name="Qtd. Vendas",
-        mode="lines+markers",
-        marker=dict(color="#862E3A"),
-        yaxis="y2",
-        hovertemplate="Vendas: %{y}<extra></extra>"
-    ))
-
-    # Linha - Média de Faturamento
-    fig.add_trace(go.Scatter(
-        x=df_hora["HORA_STR"],
-        y=[media_total] * len(df_hora),
-        name="Média de Faturamento",
-        mode="lines",
-        line=dict(color="gray", dash="dot"),
-        hoverinfo="skip"
-    ))
-
-    fig.update_layout(
-        title="Desempenho por Hora",
-        xaxis=dict(title="Hora do Dia", showgrid=False),
-        yaxis=dict(
-            title="Faturamento (R$)",
-            tickprefix="R$ ",
-            tickformat=",.0f",
-            titlefont=dict(color="#FE9C37"),
-            showgrid=False
-        ),
-        yaxis2=dict(
-            title="Qtd. Vendas",
-            overlaying="y",
-            side="right",
-            titlefont=dict(color="#862E3A"),
-            showgrid=False
-        ),
-        legend=dict(orientation="h", y=1.02, x=0.5, xanchor="center", yanchor="bottom"),
-        height=460,
-        margin=dict(t=60, l=50, r=50, b=40)
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
-
-    # Exportar para Excel
-    output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Vendas por Hora"
-    ws.append(["Hora", "Faturamento", "Qtd. Vendas", "Ticket Médio"])
-    for _, row in df_hora.iterrows():
-        ws.append([row["HORA_STR"], float(row["TOTAL"]), int(row["COD_VENDA"]), float(row["TICKET_MEDIO"])])
-    for col in ["B", "C", "D"]:
-        for cell in ws[col]:
-            cell.alignment = Alignment(horizontal="center")
-    wb.save(output)
-
-    st.download_button(
-        label="📥 Baixar Excel",
-        data=output.getvalue(),
-        file_name="vendas_por_hora.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+secao_por_hora()
 #===========================================================================================================================================================
 
 #Evolução de venda por dia da semana
 #===========================================================================================================================================================
-with st.container(border=True):
-    st.markdown("<h4 style='color:#862E3A;'>📊 Evolução de Faturamento por Dia da Semana (Drilldown Mensal com Cores)</h4>", unsafe_allow_html=True)
-
-    df_filt["MES_ANO"] = df_filt["DATA"].dt.to_period("M").astype(str)
-    meses_disp = sorted(df_filt["MES_ANO"].unique())
-
-    # Selecionar mês atual e anterior por padrão
-    if len(meses_disp) >= 2:
-        default_meses = [meses_disp[-2], meses_disp[-1]]
-    else:
-        default_meses = meses_disp
-
-    meses_selecionados = st.multiselect("Selecionar Mês(es):", meses_disp, default=default_meses)
-
-    df_mes = df_filt[df_filt["MES_ANO"].isin(meses_selecionados)].copy()
-    df_mes["SEMANA"] = df_mes["DATA"].dt.isocalendar().week
-    df_mes["ANO"] = df_mes["DATA"].dt.year
-    dias_traduzidos = {
-        "Sunday": "domingo", "Monday": "segunda-feira", "Tuesday": "terça-feira", "Wednesday": "quarta-feira",
-        "Thursday": "quinta-feira", "Friday": "sexta-feira", "Saturday": "sábado"
-    }
-    df_mes["DIA_SEMANA"] = df_mes["DATA"].dt.day_name().map(dias_traduzidos)
-
-    df_mes["INICIO_SEMANA"] = df_mes["DATA"] - pd.to_timedelta(df_mes["DATA"].dt.weekday, unit="d")
-    df_mes["FIM_SEMANA"] = df_mes["INICIO_SEMANA"] + pd.Timedelta(days=6)
-    df_mes["PERIODO"] = df_mes["INICIO_SEMANA"].dt.strftime('%d/%m') + " à " + df_mes["FIM_SEMANA"].dt.strftime('%d/%m')
-
-    df_grouped = df_mes.groupby(["SEMANA", "PERIODO", "DIA_SEMANA"])["TOTAL"].sum().reset_index()
-    df_pivot = df_grouped.pivot(index="DIA_SEMANA", columns="PERIODO", values="TOTAL").fillna(0)
-
-    # Ordem começando por domingo
-    ordem = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
-    df_pivot = df_pivot.reindex(ordem)
-    df_pivot = df_pivot[sorted(df_pivot.columns, key=lambda x: datetime.strptime(x.split(" à ")[0], "%d/%m"))]
-
-    df_formatada = pd.DataFrame(index=df_pivot.index)
-    colunas = df_pivot.columns.tolist()
-    variacoes_pct = pd.DataFrame(index=df_pivot.index)
-
-    for i, col in enumerate(colunas):
-        col_fmt = []
-        var_list = []
-        for idx in df_pivot.index:
-            valor = df_pivot.loc[idx, col]
-            texto = f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            variacao = None
-
-            if i > 0:
-                valor_ant = df_pivot.loc[idx, colunas[i - 1]]
-                if valor_ant > 0:
-                    variacao = (valor - valor_ant) / valor_ant
-                    cor = "green" if variacao > 0 else "red"
-                    texto += f"<br><span style='color:{cor}; font-size: 12px'>{variacao:+.2%}</span>"
-            col_fmt.append(texto)
-            var_list.append(variacao)
-        df_formatada[col] = col_fmt
-        variacoes_pct[col] = var_list
-
-    # === Totais semanais
-    totais_semana = df_pivot.sum(axis=0)
-    totais_variacoes = []
-    totais_formatados = []
-
-    for i, col in enumerate(colunas):
-        valor = totais_semana[col]
-        texto = f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        variacao = None
-        if i > 0:
-            valor_ant = totais_semana[colunas[i - 1]]
-            if valor_ant > 0:
-                variacao = (valor - valor_ant) / valor_ant
-                cor = "green" if variacao > 0 else "red"
-                texto += f"<br><span style='color:{cor}; font-size: 12px'>{variacao:+.2%}</span>"
-        totais_formatados.append(texto)
-        totais_variacoes.append(variacao)
-
-    # === Tabela HTML com linha extra de totais
-    tabela_html = "<table style='border-collapse: collapse; width: 100%; text-align: center;'>"
-    tabela_html += "<thead><tr><th style='padding: 6px; border: 1px solid #555;'>DIA_SEMANA</th>"
-
-    for col in colunas:
-        tabela_html += f"<th style='padding: 6px; border: 1px solid #555;'>{col}</th>"
-    tabela_html += "</tr></thead><tbody>"
-
-    for idx in df_formatada.index:
-        tabela_html += f"<tr><td style='padding: 6px; border: 1px solid #555; font-weight: bold'>{idx}</td>"
-        for col in colunas:
-            celula = df_formatada.loc[idx, col]
-            pct = variacoes_pct.loc[idx, col]
-            if pct is None or pd.isna(pct):
-                fundo = "#f0f0f0"
-            elif pct >= 0:
-                fundo = "#CCFFCC"
-            else:
-                fundo = "#FFCCCC"
-            tabela_html += f"<td style='padding: 6px; border: 1px solid #555; background-color: {fundo}; color: #111;'>{celula}</td>"
-        tabela_html += "</tr>"
-
-    # Linha de totais
-    tabela_html += f"<tr><td style='padding: 6px; border: 1px solid #555; font-weight: bold; background-color: #ddd; color: #111;'>TOTAL</td>"
-    for i, col in enumerate(colunas):
-        fundo = "#f0f0f0"
-        if i > 0 and totais_variacoes[i] is not None:
-            fundo = "#CCFFCC" if totais_variacoes[i] >= 0 else "#FFCCCC"
-        tabela_html += f"<td style='padding: 6px; border: 1px solid #555; background-color: {fundo}; color: #111; font-weight: bold;'>{totais_formatados[i]}</td>"
+# HTML refeito só quando as matrizes mudam (cache pelo hash dos arrays)
+@st.cache_data(max_entries=64)
+def html_comparativo(colunas, valores, variacao, totais, variacao_totais, inteiro):
+    return tabela_comparativo_html(DIAS_SEMANA, colunas, valores, variacao, totais, variacao_totais, inteiro)
 
+# Tabela (com linha de totais) e Excel de um Comparativo de semana.py
+def exibir_comparativo(comp, inteiro, aba, rotulo_download, arquivo):
+    colunas = comp.rotulos()
 
+    tabela_html = html_comparativo(colunas, comp.valores, comp.variacao, comp.totais, comp.variacao_totais, inteiro)
     st.markdown(tabela_html, unsafe_allow_html=True)
 
     # === Exportação para Excel
-    output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Comparativo"
-    
-    # Cabeçalhos
-    ws.append(["DIA_SEMANA"] + colunas)
-    
-    # Dados da tabela
-    for idx in df_pivot.index:
-        linha = [idx]
-        for col in colunas:
-            val = df_pivot.loc[idx, col]
-            linha.append(round(val, 2))
-        ws.append(linha)
-    
-    # Linha de total ao final
-    linha_total = ["TOTAL"]
-    for col in colunas:
-        val = totais_semana[col]
-        linha_total.append(round(val, 2))
-    ws.append(linha_total)
-    
-    # Estilização no Excel
-    for row in ws.iter_rows(min_row=2, min_col=2, max_row=ws.max_row):
-        for cell in row:
-            pct_row = cell.row - 2
-            pct_col = cell.column - 2
-            try:
-                is_total = cell.row == ws.max_row
-    
-                if is_total:
-                    pct = totais_variacoes[pct_col] if pct_col < len(totais_variacoes) else None
-                else:
-                    pct = variacoes_pct.iloc[pct_row, pct_col]
-    
-                if pct is not None:
-                    if pct >= 0:
-                        fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-                    else:
-                        fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                    cell.fill = fill
-    
-                cell.font = Font(color="000000")  # cor preta para todas as células
-                cell.alignment = Alignment(horizontal="center")
-    
-            except Exception:
-                continue
-                    
-    # Download
-    wb.save(output)
-    st.download_button(
-        label="📥 Baixar Excel",
-        data=output.getvalue(),
-        file_name="comparativo_dia_da_semana.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-#===========================================================================================================================================================
+    botao_excel(rotulo_download, arquivo, excel_comparativo,
+                aba, colunas, comp.valores, comp.variacao, comp.totais, comp.variacao_totais, inteiro)
 
+# Selecionar mês atual e anterior por padrão
+meses_padrao = meses_disponiveis[-2:]
 
-# Evolução da quantidade de vendas por dia da semana
-#===========================================================================================================================================================
-with st.container(border=True):
-    st.markdown("<h4 style='color:#862E3A;'>🧾 Evolução de Quantidade de Vendas por Dia da Semana (Drilldown Mensal com Cores)</h4>", unsafe_allow_html=True)
+@fragmento
+def secao_dia_semana(titulo, chave, metrica, inteiro, aba, rotulo_download, arquivo):
+    with st.container(border=True):
+        st.markdown(f"<h4 style='color:#862E3A;'>{titulo}</h4>", unsafe_allow_html=True)
 
-    df_filt["MES_ANO"] = df_filt["DATA"].dt.to_period("M").astype(str)
-    meses_disp = sorted(df_filt["MES_ANO"].unique())
+        meses = st.multiselect("Selecionar Mês(es):", meses_disponiveis, default=meses_padrao, key=chave,
+                               format_func=rotulo_mes)
+        comparativo = comparativo_dias_semana(versao_dados, filtro_sql(), tuple(meses))
+        exibir_comparativo(comparativo[metrica], inteiro, aba, rotulo_download, arquivo)
 
-    if len(meses_disp) >= 2:
-        default_meses = [meses_disp[-2], meses_disp[-1]]
-    else:
-        default_meses = meses_disp
-
-    meses_qtd = st.multiselect("Selecionar Mês(es):", meses_disp, default=default_meses, key="meses_qtd_venda")
-
-    df_mes = df_filt[df_filt["MES_ANO"].isin(meses_qtd)].copy()
-    df_mes["SEMANA"] = df_mes["DATA"].dt.isocalendar().week
-    df_mes["ANO"] = df_mes["DATA"].dt.year
-    dias_traduzidos = {
-        "Sunday": "domingo", "Monday": "segunda-feira", "Tuesday": "terça-feira", "Wednesday": "quarta-feira",
-        "Thursday": "quinta-feira", "Friday": "sexta-feira", "Saturday": "sábado"
-    }
-    df_mes["DIA_SEMANA"] = df_mes["DATA"].dt.day_name().map(dias_traduzidos)
-    df_mes["INICIO_SEMANA"] = df_mes["DATA"] - pd.to_timedelta(df_mes["DATA"].dt.weekday, unit="d")
-    df_mes["FIM_SEMANA"] = df_mes["INICIO_SEMANA"] + pd.Timedelta(days=6)
-    df_mes["PERIODO"] = df_mes["INICIO_SEMANA"].dt.strftime('%d/%m') + " à " + df_mes["FIM_SEMANA"].dt.strftime('%d/%m')
-
-    # Agrupamento
-    df_grouped = df_mes.groupby(["SEMANA", "PERIODO", "DIA_SEMANA"])["COD_VENDA"].nunique().reset_index()
-    df_grouped.rename(columns={"COD_VENDA": "QTDE"}, inplace=True)
-    df_pivot = df_grouped.pivot(index="DIA_SEMANA", columns="PERIODO", values="QTDE").fillna(0)
-
-    ordem = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
-    df_pivot = df_pivot.reindex(ordem)
-    df_pivot = df_pivot[sorted(df_pivot.columns, key=lambda x: datetime.strptime(x.split(" à ")[0], "%d/%m"))]
-
-    df_formatada = pd.DataFrame(index=df_pivot.index)
-    colunas = df_pivot.columns.tolist()
-    variacoes_pct = pd.DataFrame(index=df_pivot.index)
-
-    for i, col in enumerate(colunas):
-        col_fmt = []
-        var_list = []
-        for idx in df_pivot.index:
-            valor = df_pivot.loc[idx, col]
-            texto = f"{int(valor):,}".replace(",", ".")
-            variacao = None
-
-            if i > 0:
-                valor_ant = df_pivot.loc[idx, colunas[i - 1]]
-                if valor_ant > 0:
-                    variacao = (valor - valor_ant) / valor_ant
-                    cor = "green" if variacao > 0 else "red"
-                    texto += f"<br><span style='color:{cor}; font-size: 12px'>{variacao:+.2%}</span>"
-            col_fmt.append(texto)
-            var_list.append(variacao)
-        df_formatada[col] = col_fmt
-        variacoes_pct[col] = var_list
-
-    totais_semana = df_pivot.sum(axis=0)
-    totais_variacoes = []
-    totais_formatados = []
-
-    for i, col in enumerate(colunas):
-        valor = totais_semana[col]
-        texto = f"{int(valor):,}".replace(",", ".")
-        variacao = None
-        if i > 0:
-            valor_ant = totais_semana[colunas[i - 1]]
-            if valor_ant > 0:
-                variacao = (valor - valor_ant) / valor_ant
-                cor = "green" if variacao > 0 else "red"
-                texto += f"<br><span style='color:{cor}; font-size: 12px'>{variacao:+.2%}</span>"
-        totais_formatados.append(texto)
-        totais_variacoes.append(variacao)
-
-    # === Tabela HTML
-    tabela_html = "<table style='border-collapse: collapse; width: 100%; text-align: center;'>"
-    tabela_html += "<thead><tr><th style='padding: 6px; border: 1px solid #555;'>DIA_SEMANA</th>"
-
-    for col in colunas:
-        tabela_html += f"<th style='padding: 6px; border: 1px solid #555;'>{col}</th>"
-    tabela_html += "</tr></thead><tbody>"
-
-    for idx in df_formatada.index:
-        tabela_html += f"<tr><td style='padding: 6px; border: 1px solid #555; font-weight: bold'>{idx}</td>"
-        for col in colunas:
-            celula = df_formatada.loc[idx, col]
-            pct = variacoes_pct.loc[idx, col]
-            if pct is None or pd.isna(pct):
-                fundo = "#f0f0f0"
-            elif pct >= 0:
-                fundo = "#CCFFCC"
-            else:
-                fundo = "#FFCCCC"
-            tabela_html += f"<td style='padding: 6px; border: 1px solid #555; background-color: {fundo}; color: #111;'>{celula}</td>"
-        tabela_html += "</tr>"
-
-    # Linha de totais
-    tabela_html += f"<tr><td style='padding: 6px; border: 1px solid #555; font-weight: bold; background-color: #ddd; color: #111;'>TOTAL</td>"
-    for i, col in enumerate(colunas):
-        fundo = "#f0f0f0"
-        if i > 0 and totais_variacoes[i] is not None:
-            fundo = "#CCFFCC" if totais_variacoes[i] >= 0 else "#FFCCCC"
-        tabela_html += f"<td style='padding: 6px; border: 1px solid #555; background-color: {fundo}; color: #111; font-weight: bold;'>{totais_formatados[i]}</td>"
-    tabela_html += "</tr></tbody></table>"
+secao_dia_semana("📊 Evolução de Faturamento por Dia da Semana (Drilldown Mensal com Cores)", "meses_faturamento",
+                 "TOTAL", False, "Comparativo", "📥 Baixar Excel", "comparativo_dia_da_semana.xlsx")
+#===========================================================================================================================================================
 
-    st.markdown(tabela_html, unsafe_allow_html=True)
 
-    # === Exportação para Excel
-    output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Qtd_Vendas"
-
-    ws.append(["DIA_SEMANA"] + colunas)
-    for idx in df_pivot.index:
-        linha = [idx]
-        for col in colunas:
-            val = df_pivot.loc[idx, col]
-            linha.append(int(val))
-        ws.append(linha)
-
-    linha_total = ["TOTAL"]
-    for col in colunas:
-        val = totais_semana[col]
-        linha_total.append(int(val))
-    ws.append(linha_total)
-
-    for row in ws.iter_rows(min_row=2, min_col=2, max_row=ws.max_row):
-        for cell in row:
-            pct_row = cell.row - 2
-            pct_col = cell.column - 2
-            try:
-                is_total = cell.row == ws.max_row
-
-                if is_total:
-                    pct = totais_variacoes[pct_col] if pct_col < len(totais_variacoes) else None
-                else:
-                    pct = variacoes_pct.iloc[pct_row, pct_col]
-
-                if pct is not None:
-                    if pct >= 0:
-                        fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-                    else:
-                        fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                    cell.fill = fill
-
-                cell.font = Font(color="000000")
-                cell.alignment = Alignment(horizontal="center")
-
-            except Exception:
-                continue
-
-    wb.save(output)
-    st.download_button(
-        label="📥 Baixar Excel (Qtd de Vendas)",
-        data=output.getvalue(),
-        file_name="comparativo_qtd_dia_da_semana.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+# Evolução da quantidade de vendas por dia da semana
+#===========================================================================================================================================================
+secao_dia_semana("🧾 Evolução de Quantidade de Vendas por Dia da Semana (Drilldown Mensal com Cores)", "meses_qtd_venda",
+                 "QTD_VENDAS", True, "Qtd_Vendas", "📥 Baixar Excel (Qtd de Vendas)", "comparativo_qtd_dia_da_semana.xlsx")
 #===========================================================================================================================================================
 
 # Evolução do Ticket Médio por Dia da Semana
 #===========================================================================================================================================================
-with st.container(border=True):
-    st.markdown("<h4 style='color:#862E3A;'>💳 Evolução do Ticket Médio por Dia da Semana (Drilldown Mensal com Cores)</h4>", unsafe_allow_html=True)
-
-    df_filt["MES_ANO"] = df_filt["DATA"].dt.to_period("M").astype(str)
-    meses_disp = sorted(df_filt["MES_ANO"].unique())
-
-    if len(meses_disp) >= 2:
-        default_meses = [meses_disp[-2], meses_disp[-1]]
-    else:
-        default_meses = meses_disp
-
-    meses_ticket = st.multiselect("Selecionar Mês(es):", meses_disp, default=default_meses, key="meses_ticket_medio")
-
-    df_mes = df_filt[df_filt["MES_ANO"].isin(meses_ticket)].copy()
-    df_mes["SEMANA"] = df_mes["DATA"].dt.isocalendar().week
-    df_mes["ANO"] = df_mes["DATA"].dt.year
-    dias_traduzidos = {
-        "Sunday": "domingo", "Monday": "segunda-feira", "Tuesday": "terça-feira", "Wednesday": "quarta-feira",
-        "Thursday": "quinta-feira", "Friday": "sexta-feira", "Saturday": "sábado"
-    }
-    df_mes["DIA_SEMANA"] = df_mes["DATA"].dt.day_name().map(dias_traduzidos)
-    df_mes["INICIO_SEMANA"] = df_mes["DATA"] - pd.to_timedelta(df_mes["DATA"].dt.weekday, unit="d")
-    df_mes["FIM_SEMANA"] = df_mes["INICIO_SEMANA"] + pd.Timedelta(days=6)
-    df_mes["PERIODO"] = df_mes["INICIO_SEMANA"].dt.strftime('%d/%m') + " à " + df_mes["FIM_SEMANA"].dt.strftime('%d/%m')
-
-    df_grouped = df_mes.groupby(["SEMANA", "PERIODO", "DIA_SEMANA"]).agg({"TOTAL": "sum", "COD_VENDA": "nunique"}).reset_index()
-    df_grouped["TICKET"] = df_grouped["TOTAL"] / df_grouped["COD_VENDA"]
-    df_pivot = df_grouped.pivot(index="DIA_SEMANA", columns="PERIODO", values="TICKET").fillna(0)
-
-    ordem = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
-    df_pivot = df_pivot.reindex(ordem)
-    df_pivot = df_pivot[sorted(df_pivot.columns, key=lambda x: datetime.strptime(x.split(" à ")[0], "%d/%m"))]
-
-    df_formatada = pd.DataFrame(index=df_pivot.index)
-    colunas = df_pivot.columns.tolist()
-    variacoes_pct = pd.DataFrame(index=df_pivot.index)
-
-    for i, col in enumerate(colunas):
-        col_fmt = []
-        var_list = []
-        for idx in df_pivot.index:
-            valor = df_pivot.loc[idx, col]
-            texto = f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            variacao = None
-
-            if i > 0:
-                valor_ant = df_pivot.loc[idx, colunas[i - 1]]
-                if valor_ant > 0:
-                    variacao = (valor - valor_ant) / valor_ant
-                    cor = "green" if variacao > 0 else "red"
-                    texto += f"<br><span style='color:{cor}; font-size: 12px'>{variacao:+.2%}</span>"
-            col_fmt.append(texto)
-            var_list.append(variacao)
-        df_formatada[col] = col_fmt
-        variacoes_pct[col] = var_list
-
-    totais_semana = df_pivot.mean(axis=0)
-    totais_variacoes = []
-    totais_formatados = []
-
-    for i, col in enumerate(colunas):
-        valor = totais_semana[col]
-        texto = f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        variacao = None
-        if i > 0:
-            valor_ant = totais_semana[colunas[i - 1]]
-            if valor_ant > 0:
-                variacao = (valor - valor_ant) / valor_ant
-                cor = "green" if variacao > 0 else "red"
-                texto += f"<br><span style='color:{cor}; font-size: 12px'>{variacao:+.2%}</span>"
-        totais_formatados.append(texto)
-        totais_variacoes.append(variacao)
-
-    tabela_html = "<table style='border-collapse: collapse; width: 100%; text-align: center;'>"
-    tabela_html += "<thead><tr><th style='padding: 6px; border: 1px solid #555;'>DIA_SEMANA</th>"
-
-    for col in colunas:
-        tabela_html += f"<th style='padding: 6px; border: 1px solid #555;'>{col}</th>"
-    tabela_html += "</tr></thead><tbody>"
-
-    for idx in df_formatada.index:
-        tabela_html += f"<tr><td style='padding: 6px; border: 1px solid #555; font-weight: bold'>{idx}</td>"
-        for col in colunas:
-            celula = df_formatada.loc[idx, col]
-            pct = variacoes_pct.loc[idx, col]
-            if pct is None or pd.isna(pct):
-                fundo = "#f0f0f0"
-            elif pct >= 0:
-                fundo = "#CCFFCC"
-            else:
-                fundo = "#FFCCCC"
-            tabela_html += f"<td style='padding: 6px; border: 1px solid #555; background-color: {fundo}; color: #111;'>{celula}</td>"
-        tabela_html += "</tr>"
-
-    # Linha de totais
-    tabela_html += f"<tr><td style='padding: 6px; border: 1px solid #555; font-weight: bold; background-color: #ddd; color: #111;'>TOTAL</td>"
-    for i, col in enumerate(colunas):
-        fundo = "#f0f0f0"
-        if i > 0 and totais_variacoes[i] is not None:
-            fundo = "#CCFFCC" if totais_variacoes[i] >= 0 else "#FFCCCC"
-        tabela_html += f"<td style='padding: 6px; border: 1px solid #555; background-color: {fundo}; color: #111; font-weight: bold;'>{totais_formatados[i]}</td>"
-    tabela_html += "</tr></tbody></table>"
-
-    st.markdown(tabela_html, unsafe_allow_html=True)
-
-    # Export Excel
-    output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ticket_Medio"
-
-    ws.append(["DIA_SEMANA"] + colunas)
-    for idx in df_pivot.index:
-        linha = [idx]
-        for col in colunas:
-            val = df_pivot.loc[idx, col]
-            linha.append(round(val, 2))
-        ws.append(linha)
-
-    linha_total = ["TOTAL"]
-    for col in colunas:
-        val = totais_semana[col]
-        linha_total.append(round(val, 2))
-    ws.append(linha_total)
-
-    for row in ws.iter_rows(min_row=2, min_col=2, max_row=ws.max_row):
-        for cell in row:
-            pct_row = cell.row - 2
-            pct_col = cell.column - 2
-            try:
-                is_total = cell.row == ws.max_row
-
-                if is_total:
-                    pct = totais_variacoes[pct_col] if pct_col < len(totais_variacoes) else None
-                else:
-                    pct = variacoes_pct.iloc[pct_row, pct_col]
-
-                if pct is not None:
-                    if pct >= 0:
-                        fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-                    else:
-                        fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                    cell.fill = fill
-
-                cell.font = Font(color="000000")
-                cell.alignment = Alignment(horizontal="center")
-
-            except Exception:
-                continue
-
-    wb.save(output)
-    st.download_button(
-        label="📥 Baixar Excel (Ticket Médio)",
-        data=output.getvalue(),
-        file_name="comparativo_ticket_medio.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+secao_dia_semana("💳 Evolução do Ticket Médio por Dia da Semana (Drilldown Mensal com Cores)", "meses_ticket_medio",
+                 "TICKET", False, "Ticket_Medio", "📥 Baixar Excel (Ticket Médio)", "comparativo_ticket_medio.xlsx")
 #===========================================================================================================================================================
 
 
@@ -1214,6 +900,92 @@ with st.container(border=True):
 # =======================
 # 📋 TABELA DETALHADA
 # =======================
+# Só a página atual vai para o navegador: filtros de coluna e ordenação viram posições de linha
+# (em cache por filtro) e a página é uma fatia delas. As exportações percorrem o resultado em blocos.
+TAMANHO_PAGINA = 200
+COLUNAS_ORDEM_DETALHE = ["DATA", "HORA", "UN", "COD_VENDA", "DESCRICAO_PRODUTO", "TOTAL"]
+
+@st.cache_resource(max_entries=8)
+def linhas_detalhe(versao, filtro, produto, hora, coluna, decrescente, _df):
+    return detalhe.ordenar_linhas(_df, detalhe.filtrar_linhas(_df, produto, hora), coluna, decrescente)
+
+@st.cache_resource(max_entries=2)
+def exportar_detalhe(versao, filtro, produto, hora, coluna, decrescente, formato, _df):
+    linhas = linhas_detalhe(versao, filtro, produto, hora, coluna, decrescente, _df)
+    if formato == "parquet":
+        return detalhe.exportar_parquet(_df, linhas)
+    return detalhe.exportar_csv(_df, linhas)
+
+@fragmento
+def secao_detalhe():
+    col_prod, col_hora, col_ordem, col_sentido = st.columns([3, 2, 2, 1])
+    produto = col_prod.text_input("Produto contém:", key="detalhe_produto").strip()
+    hora = col_hora.slider("Hora:", 0, 23, (0, 23), key="detalhe_hora")
+    coluna = col_ordem.selectbox("Ordenar por:", COLUNAS_ORDEM_DETALHE, key="detalhe_ordem")
+    decrescente = col_sentido.toggle("Decrescente", key="detalhe_decrescente")
+
+    chave = (versao_dados, filtro_sql(), produto, None if hora == (0, 23) else hora, coluna, decrescente)
+    linhas = linhas_detalhe(*chave, df_filt)
+
+    total_paginas = max(-(-len(linhas) // TAMANHO_PAGINA), 1)
+    if st.session_state.get("detalhe_pagina", 1) > total_paginas:
+        st.session_state["detalhe_pagina"] = total_paginas
+    col_pagina, col_info = st.columns([1, 4])
+    numero = col_pagina.number_input("Página:", min_value=1, max_value=total_paginas, key="detalhe_pagina")
+    col_info.caption(f"{len(linhas):,} linhas · página {numero} de {total_paginas}".replace(",", "."))
+    st.dataframe(detalhe.pagina(df_filt, linhas, numero - 1, TAMANHO_PAGINA), use_container_width=True)
+
+    col_csv, col_parquet = st.columns(2)
+    with col_csv:
+        botao_download("📥 Baixar CSV", "📄 Gerar CSV", "detalhe_csv", "dados_filtrados.csv", detalhe.MIME_CSV,
+                       exportar_detalhe, *chave, "csv", df_filt, assinatura=chave)
+    with col_parquet:
+        botao_download("📥 Baixar Parquet", "📄 Gerar Parquet", "detalhe_parquet", "dados_filtrados.parquet",
+                       detalhe.MIME_PARQUET, exportar_detalhe, *chave, "parquet", df_filt, assinatura=chave)
+
 with st.expander("📋 Ver dados detalhados"):
     st.markdown("### 📄 Dados Filtrados por UN e Período Selecionado")
-    st.dataframe(df_filt, use_container_width=True)
+    if AGREGACAO_SQL:
+        # Sem a tabela em memória: busca as linhas mais recentes só quando pedido
+        if st.checkbox("Carregar linhas (até 1.000 mais recentes)"):
+            st.dataframe(consultar("detalhe", *filtro_sql(), limite=1000), use_container_width=True)
+    else:
+        secao_detalhe()
+
+
+# =======================
+# 📑 RELATÓRIO COMPLETO
+# =======================
+# Perfil por hora e comparativos por dia da semana de todas as lojas no período do filtro,
+# gerado em segundo plano; esta sessão só acompanha o progresso, num fragmento que se
+# atualiza sozinho a cada segundo e pede uma execução completa quando o arquivo fica pronto
+@fragmento(run_every=1)
+def progresso_relatorio(tarefa):
+    if tarefa.pronta:
+        st.rerun()
+    st.progress(tarefa.concluidas / max(len(tarefa.lojas), 1),
+                text=f"Gerando relatório: {tarefa.concluidas} de {len(tarefa.lojas)} lojas")
+
+with st.container(border=True):
+    st.markdown("<h4 style='color:#862E3A;'>📑 Relatório Completo por Loja</h4>", unsafe_allow_html=True)
+    st.caption(f"Todas as {len(todas_uns)} lojas, de {pd.Timestamp(data_ini):%d/%m/%Y} a {pd.Timestamp(data_fim):%d/%m/%Y}: uma aba por loja e métrica.")
+
+    chave_relatorio = (AGREGACAO_SQL, versao_dados, str(data_ini), str(data_fim), tuple(todas_uns))
+    tarefa = gerador_relatorios().tarefa(chave_relatorio)
+    if tarefa is None or tarefa.erro is not None:
+        if tarefa is not None:
+            st.error(f"Falha ao gerar o relatório: {tarefa.erro}")
+        if st.button("📑 Gerar relatório de todas as lojas"):
+            fonte = FonteSQL(pool_conexoes(), DIALETO) if AGREGACAO_SQL else FonteCubo(cubo)
+            tarefa = gerador_relatorios().iniciar(chave_relatorio, fonte, data_ini, data_fim, todas_uns)
+
+    if tarefa is not None and tarefa.erro is None:
+        if tarefa.pronta:
+            st.download_button(
+                label="📥 Baixar relatório completo",
+                data=tarefa.arquivo,
+                file_name=f"relatorio_lojas_{pd.Timestamp(data_ini):%Y%m%d}_{pd.Timestamp(data_fim):%Y%m%d}.xlsx",
+                mime=planilhas.MIME_XLSX
+            )
+        else:
+            progresso_relatorio(tarefa)
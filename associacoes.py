@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from periodos import IndiceDias
+
+#====================================================================================================================================
+# ÍNDICE DE CESTAS (PRODUTOS ASSOCIADOS)
+# Montado uma vez por carga: matriz esparsa venda x produto (1 = o produto está na venda),
+# com a UN e o dia de cada venda para aplicar os filtros do sidebar por linha da matriz.
+# As vendas (linhas) ficam em ordem de dia: o período do filtro é uma fatia por busca binária.
+# Para um filtro, a coocorrência produto x produto é calculada uma vez (X' X) e a busca
+# dos relacionados de qualquer produto vira a leitura de uma linha da matriz.
+
+
+class IndiceCestas:
+    def __init__(self, incidencia, produtos, dia, un):
+        self.incidencia = incidencia
+        self.produtos = produtos
+        self.dia = dia
+        self.un = un
+        self.dias = IndiceDias(dia)
+
+    @classmethod
+    def montar(cls, vendas):
+        vendas = vendas[vendas["DESCRICAO_PRODUTO"].notna()]
+        venda_idx, _ = pd.factorize(vendas["COD_VENDA"])
+        produto_idx, produtos = pd.factorize(vendas["DESCRICAO_PRODUTO"], sort=True)
+        incidencia = sparse.csr_matrix(
+            (np.ones(len(vendas), dtype=np.int32), (venda_idx, produto_idx)),
+            shape=(venda_idx.max() + 1 if len(vendas) else 0, len(produtos))
+        )
+        incidencia.sum_duplicates()
+        incidencia.data[:] = 1
+
+        # UN e dia da venda: os da primeira linha de cada COD_VENDA
+        primeira = np.unique(venda_idx, return_index=True)[1]
+        dia = vendas["DATA"].dt.normalize().to_numpy()[primeira]
+        un = vendas["UN"].to_numpy()[primeira]
+
+        # Já vem em ordem quando as vendas estão ordenadas por DATA; senão reordena as linhas
+        if len(dia) and (dia[1:] < dia[:-1]).any():
+            ordem = np.argsort(dia, kind="stable")
+            incidencia, dia, un = incidencia[ordem], dia[ordem], un[ordem]
+        return cls(incidencia, np.asarray(produtos, dtype=object), dia, un)
+
+    def filtrar(self, data_ini, data_fim, uns):
+        linhas = self.dias.fatia(data_ini, data_fim)
+        incidencia = self.incidencia[linhas]
+        return Coocorrencia(incidencia[np.isin(self.un[linhas], list(uns))], self.produtos)
+
+
+class Coocorrencia:
+    def __init__(self, incidencia, produtos):
+        self.produtos = produtos
+        self.posicao = {produto: i for i, produto in enumerate(produtos)}
+        self.total_vendas = incidencia.shape[0]
+        self.vendas_produto = np.asarray(incidencia.sum(axis=0)).ravel()
+        self.matriz = (incidencia.T @ incidencia).tocsr()
+
+    def relacionados(self, produto, n=5):
+        # FREQ: vendas com os dois produtos; VENDAS_PRODUTO: vendas com o produto relacionado
+        i = self.posicao.get(produto)
+        if i is None:
+            return pd.DataFrame(columns=["PRODUTO", "FREQ", "VENDAS_PRODUTO"]), 0, self.total_vendas
+        ini, fim = self.matriz.indptr[i], self.matriz.indptr[i + 1]
+        colunas = self.matriz.indices[ini:fim]
+        freq = self.matriz.data[ini:fim]
+        outros = (colunas != i) & (freq > 0)
+        colunas, freq = colunas[outros], freq[outros]
+        ordem = np.argsort(-freq, kind="stable")[:n]
+        relacionados = pd.DataFrame({
+            "PRODUTO": self.produtos[colunas[ordem]],
+            "FREQ": freq[ordem],
+            "VENDAS_PRODUTO": self.vendas_produto[colunas[ordem]],
+        })
+        return relacionados, int(self.vendas_produto[i]), self.total_vendas
+
+
+def metricas_associacao(relacionados, vendas_produto, total_vendas):
+    # Regra "produto selecionado -> relacionado"
+    relacionados = relacionados.copy()
+    relacionados["SUPORTE"] = relacionados["FREQ"] / total_vendas if total_vendas else 0.0
+    relacionados["CONFIANCA"] = relacionados["FREQ"] / vendas_produto if vendas_produto else 0.0
+    relacionados["LIFT"] = relacionados["CONFIANCA"] / (relacionados["VENDAS_PRODUTO"] / total_vendas) if total_vendas else 0.0
+    return relacionados
@@ -0,0 +1,424 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from pandas.tseries.api import guess_datetime_format
+
+from periodos import chave_mes
+from snapshot import geracao_snapshot, ler_snapshot, mapeia_memoria, salvar_snapshot, trava
+
+#====================================================================================================================================
+# CARGA INCREMENTAL DE PQ_VENDAS
+# Mantém o histórico já carregado em memória e busca no banco apenas as linhas
+# a partir do último valor visto da coluna de watermark (por padrão COD_VENDA).
+# Os DataFrames de uma versão nunca são alterados depois da troca: com snapshot, ficam sobre o
+# arquivo mapeado (somente leitura; no Windows, lidos para a memória) e todas as sessões recebem
+# os mesmos objetos, sem cópia.
+
+COLUNA_WATERMARK = "COD_VENDA"
+INTERVALO_RECARGA = 60  # segundos mínimos entre duas recargas forçadas
+INTERVALO_SINCRONIA = 10  # segundos entre verificações de carga nova gravada por outro processo
+
+# Só as colunas que o dashboard usa, lidas em lotes e já compactadas lote a lote:
+# o pico de memória da carga fica limitado ao tamanho do lote, não da tabela
+COLUNAS_VENDAS = ["DATA", "HORA", "UN", "COD_VENDA", "DESCRICAO_PRODUTO", "TOTAL"]
+COLUNAS_CATEGORIA = ["UN", "DESCRICAO_PRODUTO"]
+TAMANHO_LOTE = 100_000
+
+# Vendas mantidas em ordem de (DATA, UN): qualquer período é uma fatia contínua (periodos.IndiceDias)
+COLUNAS_ORDEM = ["DATA", "UN"]
+
+
+def padronizar_colunas(df):
+    df.columns = df.columns.str.strip().str.upper()
+    return df
+
+
+def formato_data(serie):
+    # Inferido uma vez e repetido em todos os lotes (e nas cargas incrementais), como
+    # aconteceria lendo a tabela inteira; inferir lote a lote troca dia e mês em datas ambíguas
+    amostra = serie.dropna()
+    if amostra.empty or not isinstance(amostra.iloc[0], str):
+        return None
+    return guess_datetime_format(amostra.iloc[0], dayfirst=True)
+
+
+def converter_datas(serie, formato=None, dayfirst=True):
+    # Coluna já em datetime (tipo nativo do banco) passa direto. Texto: cada valor distinto é
+    # convertido uma vez (com o formato explícito quando conhecido) e espalhado pelos códigos
+    # (nulo, código -1, vira NaT).
+    # Devolve também quantas linhas ficaram sem data (NaT).
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        datas = serie
+    else:
+        codigos, unicos = pd.factorize(serie)
+        if formato:
+            convertidos = pd.to_datetime(unicos, format=formato, errors="coerce")
+        else:
+            convertidos = pd.to_datetime(unicos, dayfirst=dayfirst, errors="coerce")
+        datas = pd.Series(convertidos.take(codigos, allow_fill=True, fill_value=pd.NaT), index=serie.index, name=serie.name)
+    return datas, int(datas.isna().sum())
+
+
+def preparar_vendas(df, formato=None):
+    # Linhas sem DATA válida saem da carga e são devolvidas à parte, para serem reportadas
+    df = padronizar_colunas(df)
+    df["DATA"], invalidas = converter_datas(df["DATA"], formato)
+    if not invalidas:
+        return df, df.iloc[:0]
+    sem_data = df["DATA"].isna()
+    return df[~sem_data].reset_index(drop=True), df[sem_data]
+
+
+def _inteiro(serie, tipo="int32"):
+    serie = pd.to_numeric(serie, errors="coerce")
+    if serie.isna().any():
+        return serie
+    info = np.iinfo(tipo)
+    if serie.empty or (serie.min() >= info.min and serie.max() <= info.max):
+        return serie.astype(tipo)
+    return serie.astype("int64")
+
+
+def compactar_vendas(df):
+    # TOTAL continua float64: em float32 as somas por loja/mês já perdem centavos
+    for col in COLUNAS_CATEGORIA:
+        df[col] = df[col].astype("category")
+    df["HORA"] = _inteiro(df["HORA"])
+    df["COD_VENDA"] = _inteiro(df["COD_VENDA"])
+    df["TOTAL"] = pd.to_numeric(df["TOTAL"], errors="coerce").astype("float64")
+    return df
+
+
+def concatenar_vendas(lotes):
+    # Categorias de cada lote são unificadas antes do concat para não voltar a object
+    lotes = [lote for lote in lotes if not lote.empty]
+    if not lotes:
+        return None
+    if len(lotes) == 1:
+        return lotes[0]
+    for col in COLUNAS_CATEGORIA:
+        categorias = union_categoricals([lote[col] for lote in lotes]).categories
+        for lote in lotes:
+            lote[col] = lote[col].cat.set_categories(categorias)
+    return pd.concat(lotes, ignore_index=True)
+
+
+def ordenar_vendas(df):
+    return df.sort_values(COLUNAS_ORDEM, kind="stable", ignore_index=True)
+
+
+def ler_vendas(conn, where="", params=None, formato=None, tamanho_lote=TAMANHO_LOTE):
+    sql = f"SELECT {', '.join(COLUNAS_VENDAS)} FROM PQ_VENDAS{where}"
+    lotes = []
+    descartadas = []
+    for lote in pd.read_sql(sql, conn, params=params, chunksize=tamanho_lote):
+        lote = padronizar_colunas(lote)
+        if formato is None:
+            formato = formato_data(lote["DATA"])
+        lote, sem_data = preparar_vendas(lote, formato)
+        lotes.append(compactar_vendas(lote))
+        if not sem_data.empty:
+            descartadas.append(sem_data)
+    vendas = concatenar_vendas(lotes)
+    if vendas is None:
+        # Nenhuma linha: DataFrame vazio com as mesmas colunas e tipos
+        vendas = compactar_vendas(preparar_vendas(pd.DataFrame({col: [] for col in COLUNAS_VENDAS}))[0])
+    descartadas = pd.concat(descartadas, ignore_index=True) if descartadas else pd.DataFrame(columns=COLUNAS_VENDAS)
+    return vendas, formato, descartadas
+
+
+def preparar_metas(df):
+    # ANO-MES com o mês antes do dia, como no pd.to_datetime padrão: "2026-10-01" é outubro
+    df = padronizar_colunas(df)
+    datas, _ = converter_datas(df["ANO-MES"], dayfirst=False)
+    df["MES"] = chave_mes(datas)
+    return df
+
+
+def _valor_python(valor):
+    # pyodbc não aceita tipos numpy como parâmetro
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def resumo_invalidas(valores, watermark, anterior=None):
+    # Linhas descartadas por DATA inválida, resumidas em contagem e menor/maior watermark (o
+    # metadata.json fica do mesmo tamanho). "relidas" são as da faixa >= watermark, que a próxima
+    # carga incremental lê de novo: saem da contagem anterior para não contarem duas vezes.
+    linhas = len(valores)
+    valores = valores.dropna()
+    resumo = {
+        "linhas": linhas,
+        "relidas": int((valores >= watermark).sum()) if watermark is not None else 0,
+        "menor": _valor_python(valores.min()) if len(valores) else None,
+        "maior": _valor_python(valores.max()) if len(valores) else None,
+    }
+    if anterior and anterior["linhas"]:
+        resumo["linhas"] += anterior["linhas"] - anterior["relidas"]
+        # Linhas sem watermark (NULL) contam mas não têm menor/maior: os dois podem ficar None
+        resumo["menor"] = min((v for v in (anterior["menor"], resumo["menor"]) if v is not None), default=None)
+        resumo["maior"] = max((v for v in (anterior["maior"], resumo["maior"]) if v is not None), default=None)
+    return resumo
+
+
+# Impressão digital das duas tabelas: uma consulta de uma linha, feita antes de cada
+# atualização. Linhas novas ou apagadas em PQ_VENDAS mudam contagem/watermark (alteração de
+# linhas já carregadas também passa despercebida pela carga incremental); PQ_METAS é pequena e
+# entra com a soma das metas. Igual à da última carga: não há o que recarregar.
+def impressao_dados(conn, coluna_watermark=COLUNA_WATERMARK):
+    sql = (f"SELECT (SELECT COUNT(*) FROM PQ_VENDAS) AS LINHAS_VENDAS, "
+           f"(SELECT MAX({coluna_watermark}) FROM PQ_VENDAS) AS ULTIMA_VENDA, "
+           "(SELECT COUNT(*) FROM PQ_METAS) AS LINHAS_METAS, (SELECT SUM(VALOR_META) FROM PQ_METAS) AS SOMA_METAS")
+    linha = pd.read_sql(sql, conn).to_dict("records")[0]
+    # Em texto: continua igual depois de passar pelo metadata.json (Decimal, datas)
+    return [None if pd.isna(valor) else str(valor) for valor in linha.values()]
+
+
+class LimiteRecarga:
+    # Recargas forçadas compartilhadas entre sessões: pedidos dentro de `intervalo` segundos da
+    # última recarga são absorvidos por ela. versao muda a cada recarga aceita (chave de cache).
+    def __init__(self, intervalo=INTERVALO_RECARGA):
+        self.intervalo = intervalo
+        self.versao = 0
+        self._pedida_em = None
+        self._lock = threading.Lock()
+
+    def espera(self):
+        # Segundos até a próxima recarga ser aceita
+        with self._lock:
+            if self._pedida_em is None:
+                return 0
+            return max(self.intervalo - (time.monotonic() - self._pedida_em), 0)
+
+    def pedir(self):
+        with self._lock:
+            agora = time.monotonic()
+            if self._pedida_em is not None and agora - self._pedida_em < self.intervalo:
+                return False
+            self._pedida_em = agora
+            self.versao += 1
+            return True
+
+
+class BaseVendas:
+    def __init__(self, coluna_watermark=COLUNA_WATERMARK, dir_snapshot=None, intervalo_recarga=INTERVALO_RECARGA):
+        self.coluna_watermark = coluna_watermark
+        self.dir_snapshot = dir_snapshot
+        self.vendas = None
+        self.metas = None
+        self.watermark = None
+        self.formato_data = None
+        self.carregado_em = None
+        self.conferido_em = None  # última vez que o banco foi consultado (carga ou impressão igual)
+        self.impressao = None  # impressao_dados medida antes da carga em uso
+        self.linhas_novas = 0
+        self.invalidas = resumo_invalidas(pd.Series([], dtype=object), None)  # linhas descartadas por DATA inválida
+        self.versao = 0  # incrementada a cada troca de dados; chave dos caches derivados
+        self.origem = None  # "snapshot" ou "banco"
+        self.erro_atualizacao = None  # última falha da atualização em segundo plano (None após um sucesso)
+        self.falhou_em = None
+        self._recarga_completa = False
+        self.recargas = LimiteRecarga(intervalo_recarga)
+        self._lock = threading.Lock()  # só para trocar/ler o estado; a leitura do banco roda fora dele
+        self._lock_carga = threading.Lock()  # uma carga por vez
+        self._thread = None
+        self._lock_thread = threading.Lock()
+        self._acordar = threading.Event()
+
+    @property
+    def datas_invalidas(self):
+        return self.invalidas["linhas"]
+
+    def invalidar(self):
+        # Força a próxima atualização a ser uma carga completa
+        with self._lock:
+            self._recarga_completa = True
+
+    def estado(self):
+        # (vendas, metas, versao) da mesma carga, mesmo com uma atualização trocando os dados ao lado
+        with self._lock:
+            return self.vendas, self.metas, self.versao
+
+    def _recente(self, idade_maxima):
+        return self.conferido_em is not None and (datetime.now() - self.conferido_em).total_seconds() < idade_maxima
+
+    def restaurar_snapshot(self):
+        if not self.dir_snapshot:
+            return False
+        with trava(self.dir_snapshot, exclusiva=False):
+            return self._restaurar()
+
+    def sincronizar(self):
+        # Adota a carga mais nova que outro processo gravou no diretório compartilhado; True se trocou
+        if not self.dir_snapshot or geracao_snapshot(self.dir_snapshot) <= self.versao:
+            return False
+        with self._lock_carga:
+            return geracao_snapshot(self.dir_snapshot) > self.versao and self.restaurar_snapshot()
+
+    def _restaurar(self):
+        snap = ler_snapshot(self.dir_snapshot)
+        if snap is None:
+            return False
+        vendas, metas, info = snap
+        if not vendas["DATA"].is_monotonic_increasing:
+            vendas = ordenar_vendas(vendas)  # snapshot gravado antes da ordenação
+        # Chave MES das metas sempre recalculada (tabela pequena): snapshots antigos gravaram ANO_MES
+        # em texto, ou MES lido com o dia antes do mês
+        metas = preparar_metas(metas)
+        if "ANO_MES" in vendas.columns:
+            vendas = vendas.drop(columns=["ANO_MES"])
+        with self._lock:
+            self.vendas = vendas
+            self.metas = metas
+            self.watermark = info.get("watermark")
+            self.formato_data = info.get("formato_data")
+            invalidas = info.get("invalidas", [])
+            if isinstance(invalidas, list):
+                # Snapshot antigo, com o watermark de cada linha descartada
+                invalidas = resumo_invalidas(pd.Series(invalidas, dtype=object), info.get("watermark"))
+            self.invalidas = invalidas
+            self.carregado_em = datetime.fromisoformat(info["carregado_em"])
+            self.conferido_em = self.carregado_em
+            self.impressao = info.get("impressao")
+            self.origem = "snapshot"
+            # A geração gravada vira a versão: processos com a mesma carga usam o mesmo número
+            self.versao = max(info.get("geracao", 0), self.versao + 1)
+        return True
+
+    def atualizar(self, conn, completo=False, idade_maxima=None):
+        # Lê do banco sem segurar o estado: quem consulta continua vendo a versão anterior,
+        # trocada de uma vez (vendas, metas e versão juntos) só no fim da carga.
+        # Um processo por vez na máquina (trava do snapshot); quem esperava parte da carga que o
+        # outro gravou e, com idade_maxima, nem vai ao banco se ela é recente o bastante.
+        with self._lock_carga, trava(self.dir_snapshot):
+            if self.dir_snapshot and geracao_snapshot(self.dir_snapshot) > self.versao:
+                self._restaurar()
+            col = self.coluna_watermark
+            with self._lock:
+                forcada = completo or self._recarga_completa
+                if not forcada and idade_maxima is not None and self._recente(idade_maxima):
+                    return self.vendas, self.metas, self.versao
+                atuais, watermark, formato, invalidas = self.vendas, self.watermark, self.formato_data, self.invalidas
+                completo = forcada or atuais is None or watermark is None
+                impressao_anterior = None if forcada or atuais is None else self.impressao
+                self._recarga_completa = False
+
+            # Medida antes da leitura: o que for gravado durante a carga muda a próxima impressão
+            impressao = impressao_dados(conn, col)
+            if impressao == impressao_anterior:
+                # Nada mudou no banco: mesma versão, os caches derivados continuam valendo
+                with self._lock:
+                    self.conferido_em = datetime.now()
+                    self.linhas_novas = 0
+                    return self.vendas, self.metas, self.versao
+
+            if completo:
+                vendas, formato, descartadas = ler_vendas(conn)
+                invalidas = None
+                linhas_novas = len(vendas)
+            else:
+                # Busca com ">=" para reprocessar a última venda, que pode ter
+                # chegado pela metade (itens gravados depois da carga anterior)
+                novas, formato, descartadas = ler_vendas(
+                    conn, f" WHERE {col} >= ?", [_valor_python(watermark)], formato=formato
+                )
+                antigas = atuais[atuais[col] < watermark]
+                vendas = antigas if novas.empty else concatenar_vendas([antigas.copy(), novas])
+                linhas_novas = len(novas)
+
+            vendas = ordenar_vendas(vendas)
+
+            # PQ_METAS é pequena: sempre recarregada por completo
+            metas = preparar_metas(pd.read_sql("SELECT * FROM PQ_METAS", conn))
+
+            watermark = vendas[col].max() if not vendas.empty else None
+            # Na incremental, as descartadas antes na faixa relida não contam de novo
+            invalidas = resumo_invalidas(descartadas[col], _valor_python(watermark), invalidas)
+            carregado_em = datetime.now()
+            with self._lock:
+                versao = self.versao + 1
+            if self.dir_snapshot:
+                salvar_snapshot(self.dir_snapshot, vendas, metas, {
+                    "carregado_em": carregado_em.isoformat(),
+                    "linhas": len(vendas),
+                    "coluna_watermark": col,
+                    "watermark": _valor_python(watermark),
+                    "formato_data": formato,
+                    "invalidas": invalidas,
+                    "impressao": impressao,
+                    "geracao": versao,
+                })
+                # Passa a servir o arquivo recém-gravado, mapeado em memória: a cópia lida do banco
+                # é liberada e todos os processos da máquina leem as mesmas páginas
+                # (no Windows o arquivo não é mapeado: fica a cópia que já está em memória)
+                mapeado = ler_snapshot(self.dir_snapshot) if mapeia_memoria() else None
+                if mapeado is not None:
+                    vendas, metas, _ = mapeado
+
+            with self._lock:
+                self.vendas = vendas
+                self.metas = metas
+                self.watermark = watermark
+                self.formato_data = formato
+                self.invalidas = invalidas
+                self.linhas_novas = linhas_novas
+                self.carregado_em = carregado_em
+                self.conferido_em = carregado_em
+                self.impressao = impressao
+                self.origem = "banco"
+                self.versao = versao
+            return vendas, metas, versao
+
+    # Atualização em segundo plano (stale-while-revalidate):
+    # Uma thread por base recarrega quando os dados passam de `intervalo` segundos (ou antes, quando
+    # solicitar_atualizacao é chamada) enquanto os dados atuais continuam sendo servidos. Entre uma
+    # carga e outra adota a geração mais nova gravada por outro processo (sincronizar). Se a carga
+    # falha, os últimos dados bons ficam e a falha fica registrada em erro_atualizacao/falhou_em.
+    # executar(funcao) roda funcao(conn) com uma conexão do pool (PoolConexoes.executar);
+    # ao_concluir() roda depois de cada troca de versão (carga nova ou geração de outro processo)
+    def iniciar_atualizacao_periodica(self, executar, intervalo, ao_concluir=None, imediata=False):
+        with self._lock_thread:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if imediata:
+                self._acordar.set()
+            self._thread = threading.Thread(target=self._atualizar_periodicamente, args=(executar, intervalo, ao_concluir),
+                                            name="atualiza-vendas", daemon=True)
+            self._thread.start()
+
+    def solicitar_atualizacao(self):
+        # Acorda a thread de atualização; quem chega durante a carga segue com os dados atuais.
+        # Vários pedidos antes de a thread acordar viram uma única carga.
+        self._acordar.set()
+
+    def recarregar(self):
+        # Recarga completa pedida por um usuário; False quando absorvida pela recarga recente (recargas)
+        if not self.recargas.pedir():
+            return False
+        self.invalidar()
+        self.solicitar_atualizacao()
+        return True
+
+    def _atualizar_periodicamente(self, executar, intervalo, ao_concluir):
+        while True:
+            pedida = self._acordar.wait(min(intervalo, INTERVALO_SINCRONIA))
+            self._acordar.clear()
+            if pedida or not self._recente(intervalo):
+                self._executar_atualizacao(executar, intervalo, ao_concluir)
+            elif self.sincronizar() and ao_concluir is not None:
+                ao_concluir()
+
+    def _executar_atualizacao(self, executar, intervalo, ao_concluir):
+        versao = self.versao
+        try:
+            executar(lambda conn: self.atualizar(conn, idade_maxima=intervalo))
+        except Exception as erro:
+            self.erro_atualizacao = erro
+            self.falhou_em = datetime.now()
+            return
+        self.erro_atualizacao = None
+        if ao_concluir is not None and self.versao != versao:
+            ao_concluir()
@@ -0,0 +1,127 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyodbc
+
+#====================================================================================================================================
+# CONEXÃO COM O BANCO
+# Configuração vinda de .streamlit/secrets.toml (seção [banco]) ou de variáveis de ambiente
+# PQ_DB_<CHAVE>, que têm prioridade. Credenciais não ficam mais no código.
+
+CONFIG_PADRAO = {
+    "driver": "ODBC Driver 17 for SQL Server",
+    "server": "sx-global.database.windows.net",
+    "database": "sx_comercial",
+    "uid": "",
+    "pwd": "",
+    "timeout_login": 15,        # segundos para abrir a conexão
+    "timeout_consulta": 120,    # segundos por consulta (0 = sem limite)
+    "tamanho_pool": 4,          # conexões simultâneas no máximo
+    "validar_apos": 30,         # conexão ociosa há mais que isso é testada antes do uso
+}
+
+# pd.read_sql embrulha os erros do driver em DatabaseError
+ERROS_BANCO = (pyodbc.Error, pd.errors.DatabaseError)
+
+
+def carregar_config(segredos=None):
+    config = dict(CONFIG_PADRAO)
+    config.update({str(k).lower(): v for k, v in (segredos or {}).items()})
+    for chave in config:
+        valor = os.environ.get(f"PQ_DB_{chave.upper()}")
+        if valor is not None:
+            config[chave] = valor
+    return config
+
+
+def string_conexao(config):
+    return (
+        f"DRIVER={{{config['driver']}}};"
+        f"SERVER={config['server']};"
+        f"DATABASE={config['database']};"
+        f"UID={config['uid']};"
+        f"PWD={config['pwd']}"
+    )
+
+
+#====================================================================================================================================
+# POOL
+# Conexões reaproveitadas entre sessões e recargas: evita o handshake TLS + login a cada
+# consulta e limita quantas conexões abrem ao mesmo tempo quando vários caches expiram juntos.
+class PoolConexoes:
+    def __init__(self, config):
+        self.config = config
+        self._livres = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(int(config["tamanho_pool"]))
+
+    def _abrir(self):
+        conn = pyodbc.connect(string_conexao(self.config), timeout=int(self.config["timeout_login"]))
+        conn.timeout = int(self.config["timeout_consulta"])
+        return conn
+
+    @staticmethod
+    def _fechar(conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    @staticmethod
+    def _saudavel(conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _obter(self):
+        while True:
+            try:
+                conn, ultimo_uso = self._livres.get_nowait()
+            except queue.Empty:
+                return self._abrir()
+            if time.monotonic() - ultimo_uso < float(self.config["validar_apos"]) or self._saudavel(conn):
+                return conn
+            self._fechar(conn)
+
+    @contextmanager
+    def conexao(self):
+        self._vagas.acquire()
+        conn = None
+        try:
+            conn = self._obter()
+            yield conn
+        except ERROS_BANCO:
+            # Conexão possivelmente quebrada: descarta em vez de devolver ao pool
+            if conn is not None:
+                self._fechar(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._livres.put((conn, time.monotonic()))
+            self._vagas.release()
+
+    def executar(self, funcao, *args, **kwargs):
+        # funcao(conn, ...) com uma nova tentativa em outra conexão se a primeira falhar no banco
+        try:
+            with self.conexao() as conn:
+                return funcao(conn, *args, **kwargs)
+        except ERROS_BANCO:
+            with self.conexao() as conn:
+                return funcao(conn, *args, **kwargs)
+
+    def fechar_todas(self):
+        while True:
+            try:
+                conn, _ = self._livres.get_nowait()
+            except queue.Empty:
+                return
+            self._fechar(conn)
@@ -0,0 +1,197 @@
+import os
+
+import pandas as pd
+
+from periodos import chave_semana
+
+#====================================================================================================================================
+# AGREGAÇÃO NO BANCO
+# Consultas GROUP BY parametrizadas por seção do dashboard. O período e as unidades
+# vão como parâmetros (?) e só o resultado agregado trafega até o Streamlit.
+# As expressões de data variam por banco: "mssql" para o SQL Server de produção e
+# "sqlite" para rodar as mesmas consultas contra uma base local de teste.
+
+# DATA no SQL Server pode ser date/datetime ou texto dd/mm/aaaa, como a carga em memória a lê
+# (dayfirst). CONVERT com estilo explícito lê o texto do mesmo jeito em qualquer idioma/DATEFORMAT
+# da sessão, e o estilo é ignorado quando a coluna já é de data. PQ_ESTILO_DATA troca o estilo
+# (103 = dd/mm/aaaa; 120 = aaaa-mm-dd).
+ESTILO_DATA = int(os.environ.get("PQ_ESTILO_DATA", "103"))
+
+
+def dialeto_mssql(estilo=ESTILO_DATA):
+    data = f"CONVERT(date, DATA, {int(estilo)})"
+    # 0 = segunda-feira, independente do SET DATEFIRST do servidor
+    dia_semana = f"((DATEPART(weekday, {data}) + @@DATEFIRST + 5) % 7)"
+    return {
+        "dia": data,
+        # Chaves inteiras de periodos.py: mês = ano * 12 + mês
+        "mes": f"(YEAR({data}) * 12 + MONTH({data}))",
+        "dia_semana": dia_semana,
+        "inicio_semana": f"DATEADD(day, -{dia_semana}, {data})",
+        "top": "TOP {n} ",
+        "limit": "",
+    }
+
+
+DIALETOS = {
+    "mssql": dialeto_mssql(),
+    "sqlite": {
+        "dia": "date(DATA)",
+        "mes": "(CAST(strftime('%Y', DATA) AS INTEGER) * 12 + CAST(strftime('%m', DATA) AS INTEGER))",
+        "dia_semana": "((CAST(strftime('%w', DATA) AS INTEGER) + 6) % 7)",
+        "inicio_semana": "date(DATA, '-' || ((CAST(strftime('%w', DATA) AS INTEGER) + 6) % 7) || ' days')",
+        "top": "",
+        "limit": " LIMIT {n}",
+    },
+}
+
+
+def _em(coluna, valores):
+    # IN (...) com um marcador por valor; lista vazia não seleciona nada. Inteiros numpy (chaves
+    # de mês) viram int do Python: o driver não aceita tipos numpy como parâmetro
+    if not valores:
+        return "1 = 0", []
+    return f"{coluna} IN ({', '.join('?' * len(valores))})", [v.item() if hasattr(v, "item") else v for v in valores]
+
+
+def _filtro(dialeto, data_ini, data_fim, uns):
+    d = DIALETOS[dialeto]
+    cond_un, params_un = _em("UN", uns)
+    sql = f"{d['dia']} >= ? AND {d['dia']} <= ? AND {cond_un}"
+    return sql, [pd.Timestamp(data_ini).strftime("%Y-%m-%d"), pd.Timestamp(data_fim).strftime("%Y-%m-%d")] + params_un
+
+
+def _limite(d, n):
+    # (prefixo TOP, sufixo LIMIT) do dialeto; n=None traz todas as linhas
+    if n is None:
+        return "", ""
+    return d["top"].format(n=int(n)), d["limit"].format(n=int(n))
+
+
+def _ler(conn, sql, params=None):
+    df = pd.read_sql(sql, conn, params=params)
+    df.columns = df.columns.str.upper()
+    return df
+
+
+def metas(conn, dialeto="mssql"):
+    df = pd.read_sql("SELECT * FROM PQ_METAS", conn)
+    df.columns = df.columns.str.strip().str.upper()
+    return df
+
+
+def limites(conn, data_ini=None, data_fim=None, uns=None, dialeto="mssql"):
+    d = DIALETOS[dialeto]
+    where, params = "", None
+    if uns is not None:
+        where, params = _filtro(dialeto, data_ini, data_fim, uns)
+        where = f" WHERE {where}"
+    df = _ler(conn, f"SELECT MIN({d['dia']}) AS INICIO, MAX({d['dia']}) AS FIM FROM PQ_VENDAS{where}", params)
+    return pd.to_datetime(df["INICIO"].iloc[0]), pd.to_datetime(df["FIM"].iloc[0])
+
+
+def totais(conn, data_ini, data_fim, uns, dialeto="mssql"):
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    df = _ler(conn, f"""
+        SELECT SUM(TOTAL) AS TOTAL, COUNT(DISTINCT COD_VENDA) AS QTD_VENDAS
+        FROM PQ_VENDAS
+        WHERE {where}
+    """, params)
+    return df.fillna(0)
+
+
+def faturamento_mes_un(conn, data_ini, data_fim, uns, dialeto="mssql"):
+    d = DIALETOS[dialeto]
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    return _ler(conn, f"""
+        SELECT {d['mes']} AS MES, UN, SUM(TOTAL) AS TOTAL, COUNT(DISTINCT COD_VENDA) AS QTD_VENDAS
+        FROM PQ_VENDAS
+        WHERE {where}
+        GROUP BY {d['mes']}, UN
+        ORDER BY MES, UN
+    """, params)
+
+
+def vendas_dia_hora(conn, data_ini, data_fim, uns, dialeto="mssql"):
+    d = DIALETOS[dialeto]
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    df = _ler(conn, f"""
+        SELECT {d['dia']} AS DIA, HORA, SUM(TOTAL) AS TOTAL, COUNT(DISTINCT COD_VENDA) AS QTD_VENDAS
+        FROM PQ_VENDAS
+        WHERE {where}
+        GROUP BY {d['dia']}, HORA
+    """, params)
+    df["DIA"] = pd.to_datetime(df["DIA"])
+    return df
+
+
+def vendas_semana_dia(conn, data_ini, data_fim, uns, meses, dialeto="mssql"):
+    d = DIALETOS[dialeto]
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    cond_mes, params_mes = _em(d["mes"], meses)
+    df = _ler(conn, f"""
+        SELECT {d['inicio_semana']} AS INICIO_SEMANA, {d['dia_semana']} AS DIA_SEMANA,
+               SUM(TOTAL) AS TOTAL, COUNT(DISTINCT COD_VENDA) AS QTD_VENDAS
+        FROM PQ_VENDAS
+        WHERE {where} AND {cond_mes}
+        GROUP BY {d['inicio_semana']}, {d['dia_semana']}
+    """, params + params_mes)
+    df["SEMANA"] = chave_semana(pd.to_datetime(df.pop("INICIO_SEMANA")))
+    return df
+
+
+def totais_produto(conn, data_ini, data_fim, uns, n=10, dialeto="mssql"):
+    top, limit = _limite(DIALETOS[dialeto], n)
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    return _ler(conn, f"""
+        SELECT {top}DESCRICAO_PRODUTO, SUM(TOTAL) AS TOTAL
+        FROM PQ_VENDAS
+        WHERE {where}
+        GROUP BY DESCRICAO_PRODUTO
+        ORDER BY TOTAL DESC{limit}
+    """, params)
+
+
+def produtos_associados(conn, data_ini, data_fim, uns, produto, n=5, dialeto="mssql"):
+    # Mesmo formato de associacoes.Coocorrencia.relacionados:
+    # (PRODUTO, FREQ, VENDAS_PRODUTO), vendas com o produto, total de vendas no filtro
+    top, limit = _limite(DIALETOS[dialeto], n)
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    totais_cesta = _ler(conn, f"""
+        SELECT COUNT(DISTINCT COD_VENDA) AS TOTAL_VENDAS,
+               COUNT(DISTINCT CASE WHEN DESCRICAO_PRODUTO = ? THEN COD_VENDA END) AS VENDAS
+        FROM PQ_VENDAS
+        WHERE {where}
+    """, [produto] + params)
+    freq = _ler(conn, f"""
+        SELECT {top}r.DESCRICAO_PRODUTO AS PRODUTO, r.FREQ, s.VENDAS AS VENDAS_PRODUTO
+        FROM (
+            SELECT DESCRICAO_PRODUTO, COUNT(DISTINCT COD_VENDA) AS FREQ
+            FROM PQ_VENDAS
+            WHERE {where} AND DESCRICAO_PRODUTO <> ?
+              AND COD_VENDA IN (SELECT COD_VENDA FROM PQ_VENDAS WHERE {where} AND DESCRICAO_PRODUTO = ?)
+            GROUP BY DESCRICAO_PRODUTO
+        ) r
+        JOIN (
+            SELECT DESCRICAO_PRODUTO, COUNT(DISTINCT COD_VENDA) AS VENDAS
+            FROM PQ_VENDAS
+            WHERE {where}
+            GROUP BY DESCRICAO_PRODUTO
+        ) s ON s.DESCRICAO_PRODUTO = r.DESCRICAO_PRODUTO
+        ORDER BY r.FREQ DESC{limit}
+    """, params + [produto] + params + [produto] + params)
+    totais_cesta = totais_cesta.fillna(0)
+    return freq, int(totais_cesta["VENDAS"].iloc[0]), int(totais_cesta["TOTAL_VENDAS"].iloc[0])
+
+
+def detalhe(conn, data_ini, data_fim, uns, limite=1000, dialeto="mssql"):
+    # Últimas vendas primeiro: pelo dia convertido (DATA pode ser texto dd/mm/aaaa), hora e venda
+    d = DIALETOS[dialeto]
+    top, limit = _limite(d, limite)
+    where, params = _filtro(dialeto, data_ini, data_fim, uns)
+    return _ler(conn, f"""
+        SELECT {top}*
+        FROM PQ_VENDAS
+        WHERE {where}
+        ORDER BY {d['dia']} DESC, HORA DESC, COD_VENDA DESC{limit}
+    """, params)
@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+#====================================================================================================================================
+# CONTAGEM DE VENDAS DISTINTAS POR CÉLULA
+# Quantidade de vendas (COD_VENDA distintos) não se soma entre recortes: a mesma venda pode
+# aparecer em mais de uma célula. Cada célula do cubo guarda então um "sketch" combinável,
+# e qualquer agrupamento de células é contado pela união dos sketches, sem voltar às linhas.
+#   ContagemExata: conjunto de códigos por célula (pares distintos célula x COD_VENDA)
+#   ContagemHLL:   HyperLogLog com erro relativo configurável, registros esparsos por célula
+#
+# Interface comum: contar(celulas, grupos, n_grupos) recebe os ids das células escolhidas e o
+# grupo (0..n_grupos-1) de cada uma, e devolve a quantidade de vendas distintas por grupo.
+
+
+class ContagemExata:
+    def __init__(self, celula, codigo, n_celulas):
+        self.celula = celula
+        self.codigo = codigo
+        self.n_celulas = n_celulas
+
+    @classmethod
+    def montar(cls, celula, codigo, n_celulas):
+        pares = pd.DataFrame({"CELULA": celula, "CODIGO": codigo}).drop_duplicates()
+        return cls(pares["CELULA"].to_numpy(), pares["CODIGO"].to_numpy(), n_celulas)
+
+    def contar(self, celulas, grupos, n_grupos):
+        mapa = np.full(self.n_celulas, -1, dtype=np.int64)
+        mapa[celulas] = grupos
+        grupo = mapa[self.celula]
+        usados = grupo >= 0
+        pares = pd.DataFrame({"GRUPO": grupo[usados], "CODIGO": self.codigo[usados]}).drop_duplicates()
+        return np.bincount(pares["GRUPO"].to_numpy(), minlength=n_grupos)[:n_grupos]
+
+
+def _bits(x):
+    # Tamanho em bits de cada uint64 (busca binária vetorizada, exata)
+    n = np.zeros(x.shape, dtype=np.int64)
+    for s in (32, 16, 8, 4, 2, 1):
+        maior = x >= (np.uint64(1) << np.uint64(s))
+        n[maior] += s
+        x = np.where(maior, x >> np.uint64(s), x)
+    return n + (x > 0)
+
+
+class ContagemHLL:
+    # Registros esparsos (como no modo esparso do HLL++): de cada célula só os registros não
+    # nulos, em pares (célula, índice) -> rank ordenados por célula. Numa célula de hora cabem
+    # poucas vendas, então ela ocupa alguns pares de 7 bytes em vez de 2**p registros.
+    def __init__(self, celula, indice, rank, p, n_celulas):
+        self.celula = celula  # int32
+        self.indice = indice  # uint16
+        self.rank = rank  # uint8
+        self.p = p
+        self.n_celulas = n_celulas
+
+    @staticmethod
+    def precisao(erro):
+        # erro padrão do HLL ~ 1.04 / sqrt(m)
+        return min(16, max(4, math.ceil(math.log2((1.04 / erro) ** 2))))
+
+    @staticmethod
+    def _maximos(chave, rank):
+        # Maior rank de cada chave (célula ou grupo << p | índice): a união de registros HLL
+        ordem = np.lexsort((rank, chave))
+        chave, rank = chave[ordem], rank[ordem]
+        ultimo = np.r_[chave[1:] != chave[:-1], True] if len(chave) else np.zeros(0, dtype=bool)
+        return chave[ultimo], rank[ultimo]
+
+    @classmethod
+    def montar(cls, celula, codigo, n_celulas, erro=0.02):
+        p = cls.precisao(erro)
+        h = pd.util.hash_array(np.asarray(codigo))
+        indice = (h >> np.uint64(64 - p)).astype(np.int64)
+        resto = h & np.uint64((1 << (64 - p)) - 1)
+        rank = ((64 - p) - _bits(resto) + 1).astype(np.uint8)
+        chave, rank = cls._maximos((np.asarray(celula, dtype=np.int64) << p) | indice, rank)
+        return cls((chave >> p).astype(np.int32), (chave & ((1 << p) - 1)).astype(np.uint16), rank, p, n_celulas)
+
+    @staticmethod
+    def _estimar(soma, vazios, m):
+        # soma: sum(2**-registro) de cada grupo, registros vazios (= 0) incluídos
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimativa = alpha * m * m / soma
+        # Correção para cardinalidades pequenas (contagem linear)
+        pequena = (estimativa <= 2.5 * m) & (vazios > 0)
+        linear = m * np.log(m / np.maximum(vazios, 1))
+        return np.where(pequena, linear, estimativa)
+
+    def contar(self, celulas, grupos, n_grupos):
+        m = 1 << self.p
+        mapa = np.full(self.n_celulas, -1, dtype=np.int64)
+        mapa[celulas] = grupos
+        grupo = mapa[self.celula]
+        usados = grupo >= 0
+        chave, rank = self._maximos((grupo[usados] << self.p) | self.indice[usados], self.rank[usados])
+        grupo = chave >> self.p
+        ocupados = np.bincount(grupo, minlength=n_grupos)[:n_grupos]
+        vazios = m - ocupados
+        soma = np.bincount(grupo, weights=np.ldexp(1.0, -rank.astype(np.int64)), minlength=n_grupos)[:n_grupos] + vazios
+        return np.rint(self._estimar(soma, vazios, m)).astype(np.int64)
+
+
+def montar_contagem(celula, codigo, n_celulas, modo="exato", erro=0.02):
+    if modo == "hll":
+        return ContagemHLL.montar(celula, codigo, n_celulas, erro=erro)
+    return ContagemExata.montar(celula, codigo, n_celulas)
@@ -0,0 +1,83 @@
+import numpy as np
+
+from contagem import montar_contagem
+from periodos import IndiceDias, chave_mes, chave_semana, dia_semana
+
+#====================================================================================================================================
+# CUBO DE VENDAS
+# Montado uma vez por carga e compartilhado por todas as seções do dashboard: cada
+# widget agrega as células do cubo em vez de varrer as linhas de venda de novo.
+#   celulas: (UN, DIA, HORA, DESCRICAO_PRODUTO) -> TOTAL, QTD_VENDAS
+#   horas:   (UN, DIA, HORA)                    -> TOTAL, QTD_VENDAS
+# MES (e, em horas, SEMANA e DIA_SEMANA) são as chaves inteiras de período de periodos.py.
+# QTD_VENDAS é o número de vendas distintas na própria célula. Para qualquer agrupamento de
+# células de "horas" (agregar/total_vendas) a contagem vem da união dos sketches de contagem.py,
+# exata mesmo quando uma venda aparece em mais de uma célula.
+# As duas tabelas ficam em ordem de DIA: filtrar por período é uma fatia por busca binária.
+
+
+def _agregar(vendas, chaves):
+    return vendas.groupby(chaves, observed=True).agg(
+        TOTAL=("TOTAL", "sum"),
+        QTD_VENDAS=("COD_VENDA", "nunique")
+    ).reset_index()
+
+
+def _com_periodos(df):
+    # Derivados no cubo (poucas linhas) em vez de por linha de venda; chaves inteiras de periodos.py
+    df["MES"] = chave_mes(df["DIA"])
+    return df
+
+
+class CuboVendas:
+    def __init__(self, celulas, horas, vendas_distintas):
+        self.celulas = celulas
+        self.horas = horas
+        self.vendas_distintas = vendas_distintas
+        self.dias_celulas = IndiceDias(celulas["DIA"])
+        self.dias_horas = IndiceDias(horas["DIA"])
+
+    @classmethod
+    def montar(cls, vendas, modo_contagem="exato", erro_hll=0.02):
+        vendas = vendas.assign(DIA=vendas["DATA"].dt.normalize())
+        celulas = _com_periodos(_agregar(vendas, ["UN", "DIA", "HORA", "DESCRICAO_PRODUTO"]))
+        horas = _com_periodos(_agregar(vendas, ["UN", "DIA", "HORA"]))
+        horas["SEMANA"] = chave_semana(horas["DIA"])
+        horas["DIA_SEMANA"] = dia_semana(horas["DIA"])
+        horas["CELULA"] = np.arange(len(horas))
+
+        # Célula de cada linha de venda: o id de "horas" na ordem do groupby (guardado em CELULA)
+        celula = vendas.groupby(["UN", "DIA", "HORA"], observed=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        validas = celula >= 0
+        vendas_distintas = montar_contagem(
+            celula[validas], vendas["COD_VENDA"].to_numpy()[validas], len(horas),
+            modo=modo_contagem, erro=erro_hll
+        )
+        celulas = celulas.sort_values(["DIA", "UN"], kind="stable", ignore_index=True)
+        horas = horas.sort_values(["DIA", "UN"], kind="stable", ignore_index=True)
+        return cls(celulas, horas, vendas_distintas)
+
+    def agregar(self, chaves, horas=None):
+        # Soma TOTAL e conta vendas distintas por grupo de células de "horas"
+        horas = self.horas if horas is None else horas
+        grupos = horas.groupby(chaves, observed=True)
+        resultado = grupos[["TOTAL"]].sum().reset_index()
+        resultado["QTD_VENDAS"] = self.vendas_distintas.contar(
+            horas["CELULA"].to_numpy(), grupos.ngroup().to_numpy(), len(resultado)
+        )
+        return resultado
+
+    def total_vendas(self, horas=None):
+        horas = self.horas if horas is None else horas
+        return int(self.vendas_distintas.contar(horas["CELULA"].to_numpy(), np.zeros(len(horas), dtype=np.int64), 1)[0])
+
+    def horas_periodo(self, data_ini, data_fim):
+        return self.horas.iloc[self.dias_horas.fatia(data_ini, data_fim)]
+
+    def filtrar(self, data_ini, data_fim, uns):
+        def recortar(df, dias):
+            df = df.iloc[dias.fatia(data_ini, data_fim)]
+            return df[df["UN"].isin(uns)]
+
+        return CuboVendas(recortar(self.celulas, self.dias_celulas), recortar(self.horas, self.dias_horas),
+                          self.vendas_distintas)
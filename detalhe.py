@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+#====================================================================================================================================
+# TABELA DETALHADA
+# As linhas de venda do filtro ficam no servidor: o app recebe as posições das linhas que
+# passam nos filtros de coluna, na ordem escolhida, e mostra uma página por vez. As exportações
+# CSV/Parquet percorrem o resultado em blocos, sem montar o texto ou a tabela Arrow inteira.
+
+TAMANHO_BLOCO = 50_000
+MIME_CSV = "text/csv"
+MIME_PARQUET = "application/vnd.apache.parquet"
+
+
+def filtrar_linhas(df, produto="", hora=None):
+    # produto: trecho do nome, sem diferenciar maiúsculas (testado nas categorias, não por linha);
+    # hora: (inicial, final), inclusive. Devolve as posições das linhas selecionadas.
+    mascara = np.ones(len(df), dtype=bool)
+    if produto:
+        categorias = df["DESCRICAO_PRODUTO"].cat.categories
+        codigos = np.flatnonzero(categorias.str.contains(produto, case=False, regex=False))
+        mascara &= np.isin(df["DESCRICAO_PRODUTO"].cat.codes.to_numpy(), codigos)
+    if hora is not None:
+        horas = df["HORA"].to_numpy()
+        mascara &= (horas >= hora[0]) & (horas <= hora[1])
+    return np.flatnonzero(mascara)
+
+
+def _chave_ordem(serie):
+    # Valores numéricos comparáveis: categorias pela ordem alfabética, datas pelo int64
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        posicao = np.empty(len(serie.cat.categories), dtype=np.int64)
+        posicao[np.argsort(serie.cat.categories.to_numpy(dtype=str), kind="stable")] = np.arange(len(posicao))
+        codigos = serie.cat.codes.to_numpy()
+        return np.where(codigos >= 0, posicao[codigos], len(posicao))
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float)
+
+
+def ordenar_linhas(df, linhas, coluna, decrescente=False):
+    # As vendas já chegam em ordem de DATA (carga.ordenar_vendas): nesse caso não há o que ordenar
+    if coluna == "DATA" and not decrescente:
+        return linhas
+    chave = _chave_ordem(df[coluna].iloc[linhas])
+    return linhas[np.argsort(-chave if decrescente else chave, kind="stable")]
+
+
+def pagina(df, linhas, numero, tamanho):
+    return df.iloc[linhas[numero * tamanho:(numero + 1) * tamanho]]
+
+
+def _blocos(df, linhas, tamanho_bloco):
+    for inicio in range(0, len(linhas), tamanho_bloco):
+        yield df.iloc[linhas[inicio:inicio + tamanho_bloco]]
+
+
+def exportar_csv(df, linhas, tamanho_bloco=TAMANHO_BLOCO):
+    saida = io.BytesIO()
+    df.iloc[:0].to_csv(saida, index=False, encoding="utf-8")
+    for bloco in _blocos(df, linhas, tamanho_bloco):
+        bloco.to_csv(saida, header=False, index=False, encoding="utf-8")
+    return saida.getvalue()
+
+
+def exportar_parquet(df, linhas, tamanho_bloco=TAMANHO_BLOCO):
+    # Um row group por bloco; o esquema vem do DataFrame (categorias viram dicionário)
+    saida = io.BytesIO()
+    esquema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(saida, esquema) as escritor:
+        for bloco in _blocos(df, linhas, tamanho_bloco):
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+    return saida.getvalue()
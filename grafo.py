@@ -0,0 +1,82 @@
+import numpy as np
+import plotly.graph_objects as go
+
+#====================================================================================================================================
+# GRAFO DE PRODUTOS ASSOCIADOS
+# O grafo é sempre uma estrela: o produto selecionado no centro e até n relacionados ao redor.
+# O layout "radial" é fechado (ângulos fixos), sem networkx no caminho da requisição, e dá
+# sempre a mesma posição para a mesma lista. "spring" mantém o layout antigo do networkx.
+
+
+def posicoes_radiais(produto, relacionados):
+    # Centro em (0, 0) e relacionados num círculo, o mais frequente no topo, sentido horário
+    angulos = np.pi / 2 - 2 * np.pi * np.arange(len(relacionados)) / max(len(relacionados), 1)
+    pos = {produto: (0.0, 0.0)}
+    pos.update({nome: (float(np.cos(a)), float(np.sin(a))) for nome, a in zip(relacionados, angulos)})
+    return pos
+
+
+def posicoes_spring(produto, relacionados, pcts):
+    import networkx as nx
+
+    G = nx.Graph()
+    G.add_node(produto)
+    for nome, pct in zip(relacionados, pcts):
+        G.add_edge(produto, nome, weight=pct)
+    return nx.spring_layout(G, seed=42, k=0.8)
+
+
+def figura_associados(produto, relacionados, pcts, layout="radial"):
+    # relacionados/pcts: nomes e % das vendas do produto selecionado que levam cada um
+    if layout == "spring":
+        pos = posicoes_spring(produto, relacionados, pcts)
+    else:
+        pos = posicoes_radiais(produto, relacionados)
+
+    x0, y0 = pos[produto]
+    edge_x, edge_y = [], []
+    for nome in relacionados:
+        x1, y1 = pos[nome]
+        edge_x += [x0, x1, None]
+        edge_y += [y0, y1, None]
+
+    edge_trace = go.Scatter(
+        x=edge_x, y=edge_y,
+        line=dict(width=1.5, color="#A4B494"),
+        hoverinfo="none",
+        mode="lines"
+    )
+
+    node_x = [x0] + [pos[nome][0] for nome in relacionados]
+    node_y = [y0] + [pos[nome][1] for nome in relacionados]
+    node_text = [f"<b>{produto}</b>"] + [
+        f"<b>{nome}</b><br><span style='font-size:18px; color:#333;'>em {pct:.1%} das vendas de {produto}</span>"
+        for nome, pct in zip(relacionados, pcts)
+    ]
+    node_size = [50] + [20 + pct * 100 for pct in pcts]
+
+    node_trace = go.Scatter(
+        x=node_x, y=node_y,
+        mode="markers+text",
+        hoverinfo="skip",
+        text=node_text,
+        textposition="bottom center",
+        marker=dict(
+            showscale=False,
+            color=node_size,
+            size=node_size,
+            colorscale="OrRd",
+            line_width=2
+        )
+    )
+
+    return go.Figure(data=[edge_trace, node_trace],
+                     layout=go.Layout(
+                         title=dict(text=f"Produtos Relacionados a: {produto}", font=dict(size=16)),
+                         showlegend=False,
+                         margin=dict(t=40, l=0, r=0, b=0),
+                         hovermode="closest",
+                         xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                         yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                         height=400
+                     ))
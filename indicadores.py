@@ -0,0 +1,139 @@
+import calendar
+
+import pandas as pd
+
+import consultas
+from associacoes import metricas_associacao
+from periodos import rotulo_mes
+
+#====================================================================================================================================
+# INDICADORES DO DASHBOARD
+# Os cálculos de cada bloco do app.py como funções puras sobre os agregados (sem Streamlit),
+# para serem usados tanto pelo dashboard quanto pelo relatório completo e pela geração em lote.
+
+
+def resumo_cards(fat_total, qtd_vendas, meta_total):
+    return {
+        "FATURAMENTO": fat_total,
+        "META": meta_total,
+        "PROGRESSO": (fat_total / meta_total) * 100 if meta_total > 0 else 0,
+        "QTD_VENDAS": qtd_vendas,
+        "TICKET": fat_total / qtd_vendas if qtd_vendas > 0 else 0,
+    }
+
+
+def faturamento_vs_meta(df_mes_un, metas):
+    # Mantém todos os meses da meta (mesmo se não houve venda); rótulo ANO_MES só para o gráfico
+    df_mes = df_mes_un.groupby("MES")["TOTAL"].sum().reset_index()
+    df_meta_mes = metas.groupby("MES")["VALOR_META"].sum().reset_index()
+    df_merged = pd.merge(df_meta_mes, df_mes, on="MES", how="left").fillna(0)
+    df_merged["PCT"] = df_merged["TOTAL"] / df_merged["VALOR_META"]
+    df_merged.insert(0, "ANO_MES", [rotulo_mes(mes) for mes in df_merged["MES"]])
+    return df_merged
+
+
+def projecao_mes(df_mes_un, metas, hoje):
+    # Mês de "hoje" por UN: realizado, quanto falta para a meta e projeção pela média diária
+    mes_atual = hoje.year * 12 + hoje.month
+    dia_hoje = hoje.day
+    dias_no_mes = calendar.monthrange(hoje.year, hoje.month)[1]
+
+    df_mes_atual = df_mes_un[df_mes_un["MES"] == mes_atual]
+    metas_mes_atual = metas[metas["MES"] == mes_atual].copy()
+
+    df_un_fat = df_mes_atual.groupby("UN", observed=True)["TOTAL"].sum().reset_index()
+    df_merge = pd.merge(
+        metas_mes_atual.rename(columns={"LOJA": "UN"}),
+        df_un_fat,
+        on="UN",
+        how="left"
+    ).fillna(0)
+
+    df_merge["FALTA_META"] = (df_merge["VALOR_META"] - df_merge["TOTAL"]).clip(lower=0)
+    df_merge["MEDIA_DIARIA"] = df_merge["TOTAL"] / dia_hoje
+    df_merge["FAT_PROJETADO"] = df_merge["MEDIA_DIARIA"] * dias_no_mes
+    df_merge["PCT_PROJETADO"] = df_merge["FAT_PROJETADO"] / df_merge["VALOR_META"]
+
+    meta = df_merge["VALOR_META"].sum()
+    fat_proj = df_merge["FAT_PROJETADO"].sum()
+    resumo = {
+        "FAT_REALIZADO": df_merge["TOTAL"].sum(),
+        "META": meta,
+        "FAT_PROJETADO": fat_proj,
+        "PCT_PROJETADO": fat_proj / meta if meta > 0 else 0,
+    }
+    return df_merge, resumo
+
+
+def perfil_hora(dia_hora):
+    # (DIA, HORA) -> por HORA; vendas distintas somam entre dias: cada venda pertence a um único dia
+    df_hora = dia_hora.groupby("HORA")[["TOTAL", "QTD_VENDAS"]].sum().reset_index()
+    df_hora = df_hora.rename(columns={"QTD_VENDAS": "COD_VENDA"}).sort_values("HORA")
+    df_hora["TICKET_MEDIO"] = df_hora["TOTAL"] / df_hora["COD_VENDA"]
+    df_hora["HORA_STR"] = df_hora["HORA"].astype(str) + "h"
+    return df_hora
+
+
+def associacoes_top(coocorrencia, produtos, n=5):
+    # Relacionados de cada produto da lista, com suporte, confiança e lift
+    tabelas = []
+    for produto in produtos:
+        relacionados, vendas_produto, total_vendas = coocorrencia.relacionados(produto, n)
+        relacionados = metricas_associacao(relacionados, vendas_produto, total_vendas)
+        relacionados.insert(0, "PRODUTO_BASE", produto)
+        tabelas.append(relacionados)
+    if not tabelas:
+        return pd.DataFrame(columns=["PRODUTO_BASE", "PRODUTO", "FREQ", "VENDAS_PRODUTO", "SUPORTE", "CONFIANCA", "LIFT"])
+    return pd.concat(tabelas, ignore_index=True)
+
+
+#====================================================================================================================================
+# FONTES DE DADOS
+# Mesma interface para o cubo em memória e para a agregação no banco; ambas são seguras para
+# uso em várias threads (o cubo só é lido, o pool entrega uma conexão por chamada).
+class FonteCubo:
+    def __init__(self, cubo):
+        self.cubo = cubo
+
+    def totais(self, data_ini, data_fim, uns):
+        cubo = self.cubo.filtrar(data_ini, data_fim, uns)
+        return cubo.horas["TOTAL"].sum(), cubo.total_vendas()
+
+    def mes_un(self, data_ini, data_fim, uns):
+        return self.cubo.filtrar(data_ini, data_fim, uns).agregar(["MES", "UN"])
+
+    def produtos(self, data_ini, data_fim, uns, n=10):
+        celulas = self.cubo.filtrar(data_ini, data_fim, uns).celulas
+        df_prod = celulas.groupby("DESCRICAO_PRODUTO", observed=True)["TOTAL"].sum().reset_index()
+        df_prod = df_prod.sort_values("TOTAL", ascending=False)
+        return df_prod if n is None else df_prod.head(n)
+
+    def dia_hora(self, data_ini, data_fim, uns):
+        return self.cubo.filtrar(data_ini, data_fim, uns).agregar(["DIA", "HORA"])
+
+    def semana_dia(self, data_ini, data_fim, uns, meses):
+        cubo = self.cubo.filtrar(data_ini, data_fim, uns)
+        horas = cubo.horas[cubo.horas["MES"].isin(meses)]
+        return cubo.agregar(["SEMANA", "DIA_SEMANA"], horas)
+
+
+class FonteSQL:
+    def __init__(self, pool, dialeto):
+        self.pool = pool
+        self.dialeto = dialeto
+
+    def totais(self, data_ini, data_fim, uns):
+        df_tot = self.pool.executar(consultas.totais, data_ini, data_fim, tuple(uns), dialeto=self.dialeto)
+        return float(df_tot["TOTAL"].iloc[0]), int(df_tot["QTD_VENDAS"].iloc[0])
+
+    def mes_un(self, data_ini, data_fim, uns):
+        return self.pool.executar(consultas.faturamento_mes_un, data_ini, data_fim, tuple(uns), dialeto=self.dialeto)
+
+    def produtos(self, data_ini, data_fim, uns, n=10):
+        return self.pool.executar(consultas.totais_produto, data_ini, data_fim, tuple(uns), n=n, dialeto=self.dialeto)
+
+    def dia_hora(self, data_ini, data_fim, uns):
+        return self.pool.executar(consultas.vendas_dia_hora, data_ini, data_fim, tuple(uns), dialeto=self.dialeto)
+
+    def semana_dia(self, data_ini, data_fim, uns, meses):
+        return self.pool.executar(consultas.vendas_semana_dia, data_ini, data_fim, tuple(uns), tuple(meses), dialeto=self.dialeto)
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import re
+import tomllib
+from datetime import datetime
+
+import pandas as pd
+
+from associacoes import IndiceCestas
+from carga import BaseVendas
+from conexao import PoolConexoes, carregar_config
+from cubo import CuboVendas
+from indicadores import (FonteCubo, associacoes_top, faturamento_vs_meta, perfil_hora, projecao_mes,
+                         resumo_cards)
+from semana import comparativo_semanas
+
+#====================================================================================================================================
+# GERAÇÃO EM LOTE
+# Calcula fora do Streamlit os mesmos indicadores do dashboard para cada período (mês) e loja,
+# mais o consolidado de todas as lojas, e grava em disco:
+#   <saida>/<AAAA-MM>/<LOJA ou TODAS>/cards.json, meta_mensal, hora, semana_*, associacoes (.parquet)
+#   <saida>/projecao_mes.parquet e <saida>/indice.json
+# Uso: python lote.py --saida lote --meses 3 [--snapshot]
+
+TODAS = "TODAS"
+
+
+def _segredos(caminho=".streamlit/secrets.toml"):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "rb") as arquivo:
+        return tomllib.load(arquivo).get("banco", {})
+
+
+def _pasta(nome):
+    return re.sub(r"[^\w\- ]", "_", str(nome)).strip() or "_"
+
+
+def carregar_base(dir_snapshot, somente_snapshot):
+    base = BaseVendas(dir_snapshot=dir_snapshot)
+    if somente_snapshot:
+        if not base.restaurar_snapshot():
+            raise SystemExit(f"Snapshot não encontrado em {dir_snapshot}")
+    else:
+        base.restaurar_snapshot()
+        PoolConexoes(carregar_config(_segredos())).executar(base.atualizar)
+    return base
+
+
+def periodos(vendas, n_meses):
+    # Últimos n meses com venda: (AAAA-MM, início, fim), o mês corrente até o último dia com dados
+    fim_dados = vendas["DATA"].max().normalize()
+    meses = pd.period_range(end=fim_dados.to_period("M"), periods=n_meses, freq="M")
+    return [(str(mes), mes.start_time, min(mes.end_time.normalize(), fim_dados)) for mes in meses]
+
+
+def indicadores_loja(fonte, coocorrencia, metas, data_ini, data_fim, uns, top):
+    df_mes_un = fonte.mes_un(data_ini, data_fim, uns)
+    meses = sorted(df_mes_un["MES"].unique())
+    metas = metas[metas["LOJA"].isin(uns) & metas["MES"].isin(meses)]
+
+    df_semana = comparativo_semanas(fonte.semana_dia(data_ini, data_fim, uns, meses))
+    produtos = fonte.produtos(data_ini, data_fim, uns, n=top)["DESCRICAO_PRODUTO"].tolist()
+    return {
+        "cards": resumo_cards(*fonte.totais(data_ini, data_fim, uns), metas["VALOR_META"].sum()),
+        "meta_mensal": faturamento_vs_meta(df_mes_un, metas),
+        "hora": perfil_hora(fonte.dia_hora(data_ini, data_fim, uns)),
+        "semana_faturamento": df_semana["TOTAL"].como_dataframe(),
+        "semana_qtd_vendas": df_semana["QTD_VENDAS"].como_dataframe(),
+        "semana_ticket": df_semana["TICKET"].como_dataframe(),
+        "associacoes": associacoes_top(coocorrencia, produtos),
+    }
+
+
+def gravar(pasta, resultado):
+    os.makedirs(pasta, exist_ok=True)
+    for nome, valor in resultado.items():
+        if isinstance(valor, pd.DataFrame):
+            valor.to_parquet(os.path.join(pasta, f"{nome}.parquet"))
+        else:
+            with open(os.path.join(pasta, f"{nome}.json"), "w", encoding="utf-8") as arquivo:
+                json.dump({k: v.item() if hasattr(v, "item") else v for k, v in valor.items()}, arquivo, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula os indicadores do dashboard por período e loja.")
+    parser.add_argument("--saida", default="lote", help="pasta de destino (padrão: lote)")
+    parser.add_argument("--meses", type=int, default=3, help="quantidade de meses, a partir do último com venda (padrão: 3)")
+    parser.add_argument("--top", type=int, default=10, help="produtos com associações calculadas (padrão: 10)")
+    parser.add_argument("--snapshot", action="store_true", help="usa só o snapshot local, sem consultar o banco")
+    parser.add_argument("--dir-snapshot", default=os.environ.get("PQ_SNAPSHOT_DIR", "snapshot"))
+    args = parser.parse_args(argv)
+
+    base = carregar_base(args.dir_snapshot, args.snapshot)
+    vendas, metas = base.vendas, base.metas
+    if base.datas_invalidas:
+        print(f"{base.datas_invalidas} linha(s) de PQ_VENDAS com DATA inválida ficaram fora da carga")
+    fonte = FonteCubo(CuboVendas.montar(vendas))
+    indice = IndiceCestas.montar(vendas)
+    lojas = sorted(metas["LOJA"].dropna().unique())
+
+    gerados = []
+    for periodo, data_ini, data_fim in periodos(vendas, args.meses):
+        for loja, uns in [(TODAS, lojas)] + [(un, [un]) for un in lojas]:
+            coocorrencia = indice.filtrar(data_ini, data_fim, uns)
+            resultado = indicadores_loja(fonte, coocorrencia, metas, data_ini, data_fim, uns, args.top)
+            gravar(os.path.join(args.saida, periodo, _pasta(loja)), resultado)
+            gerados.append({"periodo": periodo, "loja": loja, "inicio": str(data_ini.date()), "fim": str(data_fim.date())})
+            print(f"{periodo} {loja}: ok")
+
+    # Projeção do mês corrente, por UN (mesmo cálculo do dashboard)
+    hoje = datetime.today()
+    inicio_mes = pd.Timestamp(hoje).to_period("M").start_time
+    df_mes_un = fonte.mes_un(inicio_mes, pd.Timestamp(hoje).normalize(), lojas)
+    df_projecao, _ = projecao_mes(df_mes_un, metas, hoje)
+    os.makedirs(args.saida, exist_ok=True)
+    df_projecao.to_parquet(os.path.join(args.saida, "projecao_mes.parquet"))
+
+    with open(os.path.join(args.saida, "indice.json"), "w", encoding="utf-8") as arquivo:
+        json.dump({
+            "gerado_em": hoje.isoformat(timespec="seconds"),
+            "dados_ate": str(vendas["DATA"].max()),
+            "resultados": gerados,
+        }, arquivo, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+#====================================================================================================================================
+# ÍNDICE POR DIA
+# Para tabelas mantidas em ordem de data (vendas por DATA/UN, células do cubo por DIA): guarda o dia
+# e a posição da primeira linha de cada dia, e resolve qualquer período por busca binária numa
+# fatia contínua de linhas, sem varrer nem comparar a coluna inteira.
+
+
+def _dia(data):
+    return np.datetime64(pd.Timestamp(data).date(), "D")
+
+
+class IndiceDias:
+    def __init__(self, datas):
+        dias = np.asarray(datas, dtype="datetime64[ns]").astype("datetime64[D]")
+        inicio = np.flatnonzero(np.r_[True, dias[1:] != dias[:-1]]) if len(dias) else np.zeros(0, dtype=np.int64)
+        self.dias = dias[inicio]
+        self.inicios = np.r_[inicio, len(dias)]
+
+    def fatia(self, data_ini, data_fim):
+        # Linhas de data_ini a data_fim (dias inteiros, inclusive)
+        i = np.searchsorted(self.dias, _dia(data_ini), side="left")
+        j = np.searchsorted(self.dias, _dia(data_fim), side="right")
+        return slice(int(self.inicios[i]), int(self.inicios[max(i, j)]))
+
+
+#====================================================================================================================================
+# CHAVES INTEIRAS DE PERÍODO
+# Mês = ano * 12 + mês e semana = número do dia (desde 1970-01-01) da segunda-feira, calculados por
+# aritmética sobre datetime64. Agrupamentos, junção com PQ_METAS e ordenação usam as chaves; os
+# rótulos ("AAAA-MM", "dd/mm à dd/mm") só são gerados para as poucas chaves distintas na exibição.
+
+
+def _dias(datas):
+    return np.asarray(datas, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+
+def chave_mes(datas):
+    meses = np.asarray(datas, dtype="datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+    return (meses + 1970 * 12 + 1).astype(np.int32)
+
+
+def rotulo_mes(chave):
+    chave = int(chave) - 1
+    return f"{chave // 12:04d}-{chave % 12 + 1:02d}"
+
+
+def meses_periodo(data_ini, data_fim):
+    inicio, fim = chave_mes([pd.Timestamp(data_ini), pd.Timestamp(data_fim)])
+    return list(range(int(inicio), int(fim) + 1))
+
+
+def dia_semana(datas):
+    # 0 = segunda-feira (1970-01-01 foi uma quinta)
+    return ((_dias(datas) + 3) % 7).astype(np.int8)
+
+
+def chave_semana(datas):
+    dias = _dias(datas)
+    return (dias - (dias + 3) % 7).astype(np.int32)
+
+
+def rotulos_semana(chaves):
+    inicio = pd.to_datetime(np.asarray(chaves, dtype=np.int64), unit="D")
+    fim = inicio + pd.Timedelta(days=6)
+    return list(inicio.strftime("%d/%m") + " à " + fim.strftime("%d/%m"))
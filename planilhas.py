@@ -0,0 +1,76 @@
+import io
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+#====================================================================================================================================
+# EXPORTAÇÃO PARA EXCEL
+# Planilhas gravadas em modo write-only (linha a linha, sem manter as células em memória) com
+# estilos nomeados registrados uma vez por arquivo, em vez de um PatternFill/Font/Alignment
+# novo por célula. As funções devolvem os bytes do .xlsx; o app só as chama quando o usuário
+# pede o download.
+
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _estilo(nome, cor=None):
+    estilo = NamedStyle(name=nome, font=Font(color="000000"), alignment=Alignment(horizontal="center"))
+    if cor:
+        estilo.fill = PatternFill(start_color=cor, end_color=cor, fill_type="solid")
+    return estilo
+
+
+def novo_workbook():
+    wb = Workbook(write_only=True)
+    for estilo in (_estilo("pq_centro"), _estilo("pq_alta", "CCFFCC"), _estilo("pq_baixa", "FFCCCC")):
+        wb.add_named_style(estilo)
+    return wb
+
+
+def salvar(wb):
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def _celula(ws, valor, estilo):
+    celula = WriteOnlyCell(ws, value=valor)
+    celula.style = estilo
+    return celula
+
+
+def escrever_por_hora(wb, aba, df_hora):
+    ws = wb.create_sheet(aba)
+    ws.append(["Hora"] + [_celula(ws, titulo, "pq_centro") for titulo in ("Faturamento", "Qtd. Vendas", "Ticket Médio")])
+    for hora, total, qtd, ticket in zip(df_hora["HORA_STR"], df_hora["TOTAL"], df_hora["COD_VENDA"], df_hora["TICKET_MEDIO"]):
+        ws.append([hora, _celula(ws, float(total), "pq_centro"), _celula(ws, int(qtd), "pq_centro"), _celula(ws, float(ticket), "pq_centro")])
+    return ws
+
+
+def escrever_comparativo(wb, aba, linhas, colunas, valores, variacao, totais, variacao_totais, inteiro=False):
+    # Linhas x semanas + TOTAL; verde/vermelho pela variação contra a semana anterior
+    ws = wb.create_sheet(aba)
+    ws.append(["DIA_SEMANA"] + list(colunas))
+    valores = np.vstack([valores, totais])
+    variacao = np.vstack([variacao, variacao_totais])
+    estilos = np.where(np.isnan(variacao), "pq_centro", np.where(variacao >= 0, "pq_alta", "pq_baixa"))
+    for nome, linha, estilos_linha in zip(list(linhas) + ["TOTAL"], valores, estilos):
+        ws.append([nome] + [
+            _celula(ws, int(valor) if inteiro else round(float(valor), 2), estilo)
+            for valor, estilo in zip(linha, estilos_linha)
+        ])
+    return ws
+
+
+def excel_por_hora(df_hora):
+    wb = novo_workbook()
+    escrever_por_hora(wb, "Vendas por Hora", df_hora)
+    return salvar(wb)
+
+
+def excel_comparativo(aba, linhas, colunas, valores, variacao, totais, variacao_totais, inteiro=False):
+    wb = novo_workbook()
+    escrever_comparativo(wb, aba, linhas, colunas, valores, variacao, totais, variacao_totais, inteiro)
+    return salvar(wb)
@@ -0,0 +1,100 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import planilhas
+from indicadores import perfil_hora
+from periodos import meses_periodo
+from semana import DIAS_SEMANA, comparativo_semanas
+
+#====================================================================================================================================
+# RELATÓRIO COMPLETO POR LOJA
+# Um único .xlsx com o perfil por hora e os três comparativos por dia da semana de cada UN.
+# As lojas são calculadas em paralelo num pool de threads fora da thread do script do
+# Streamlit; o app só acompanha o progresso e oferece o arquivo quando fica pronto.
+# As fontes de dados (cubo ou banco) são as de indicadores.py.
+
+
+def dados_loja(fonte, data_ini, data_fim, un):
+    df_hora = perfil_hora(fonte.dia_hora(data_ini, data_fim, [un]))
+    comparativos = comparativo_semanas(fonte.semana_dia(data_ini, data_fim, [un], meses_periodo(data_ini, data_fim)))
+    return df_hora, comparativos
+
+
+def _nome_aba(un, metrica, usados):
+    # Excel: até 31 caracteres, sem []:*?/\ e sem repetir (maiúsculas e minúsculas se confundem).
+    # Só o nome da loja é encurtado, para " - métrica" sempre caber; lojas que coincidem depois do
+    # corte ganham um número (" 2", " 3"...).
+    sufixo = f" - {metrica}"
+    loja = re.sub(r"[\[\]:*?/\\]", "-", str(un))
+    nome = loja[:31 - len(sufixo)].rstrip() + sufixo
+    n = 2
+    while nome.lower() in usados:
+        marca = f" {n}"
+        nome = loja[:31 - len(sufixo) - len(marca)].rstrip() + marca + sufixo
+        n += 1
+    usados.add(nome.lower())
+    return nome
+
+
+def montar_relatorio(resultados):
+    # resultados: [(un, df_hora, comparativos)] na ordem das abas
+    wb = planilhas.novo_workbook()
+    usados = set()
+    for un, df_hora, comparativos in resultados:
+        planilhas.escrever_por_hora(wb, _nome_aba(un, "Hora", usados), df_hora)
+        for metrica, titulo, inteiro in (("TOTAL", "Faturamento", False), ("QTD_VENDAS", "Qtd Vendas", True), ("TICKET", "Ticket Médio", False)):
+            comp = comparativos[metrica]
+            planilhas.escrever_comparativo(wb, _nome_aba(un, titulo, usados), DIAS_SEMANA, comp.rotulos(), comp.valores,
+                                           comp.variacao, comp.totais, comp.variacao_totais, inteiro)
+    return planilhas.salvar(wb)
+
+
+#====================================================================================================================================
+# EXECUÇÃO EM SEGUNDO PLANO
+class TarefaRelatorio:
+    def __init__(self, lojas):
+        self.lojas = list(lojas)
+        self.concluidas = 0
+        self.arquivo = None
+        self.erro = None
+        self.pronta = False
+
+
+class GeradorRelatorios:
+    # Compartilhado entre sessões: pedidos com a mesma chave (dados + período) reaproveitam a tarefa
+    def __init__(self, max_workers=4, max_tarefas=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="relatorio")
+        self._tarefas = OrderedDict()
+        self._max_tarefas = max_tarefas
+        self._lock = threading.Lock()
+
+    def tarefa(self, chave):
+        with self._lock:
+            return self._tarefas.get(chave)
+
+    def iniciar(self, chave, fonte, data_ini, data_fim, lojas):
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None and tarefa.erro is None:
+                return tarefa
+            tarefa = TarefaRelatorio(lojas)
+            self._tarefas[chave] = tarefa
+            while len(self._tarefas) > self._max_tarefas:
+                self._tarefas.popitem(last=False)
+        threading.Thread(target=self._executar, args=(tarefa, fonte, data_ini, data_fim),
+                         name="relatorio-lojas", daemon=True).start()
+        return tarefa
+
+    def _executar(self, tarefa, fonte, data_ini, data_fim):
+        try:
+            futuros = {self._executor.submit(dados_loja, fonte, data_ini, data_fim, un): un for un in tarefa.lojas}
+            resultados = {}
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]] = futuro.result()
+                tarefa.concluidas += 1
+            tarefa.arquivo = montar_relatorio([(un,) + resultados[un] for un in tarefa.lojas])
+        except Exception as erro:
+            tarefa.erro = erro
+        tarefa.pronta = True
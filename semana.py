@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from periodos import rotulos_semana
+
+#====================================================================================================================================
+# COMPARATIVO POR DIA DA SEMANA
+# Uma passada sobre o agregado (SEMANA, DIA_SEMANA) -> TOTAL, QTD_VENDAS monta as matrizes
+# dia da semana x semana das três métricas (faturamento, quantidade e ticket médio) e as
+# variações semana contra semana, tudo em numpy. Semanas são chaves inteiras (dia da segunda-feira
+# desde 1970-01-01); nomes de dia e rótulos "dd/mm à dd/mm" só são gerados na exibição.
+
+DIAS_SEMANA = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
+
+
+def variacao(valores):
+    # (atual - anterior) / anterior ao longo do último eixo; NaN na primeira semana e sem base > 0
+    valores = np.asarray(valores, dtype=float)
+    resultado = np.full(valores.shape, np.nan)
+    anterior = valores[..., :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultado[..., 1:] = np.where(anterior > 0, (valores[..., 1:] - anterior) / anterior, np.nan)
+    return resultado
+
+
+class Comparativo:
+    # valores: 7 x semanas; totais: linha TOTAL (soma, ou média dos dias no ticket médio)
+    def __init__(self, valores, totais, semanas):
+        self.valores = valores
+        self.totais = totais
+        self.semanas = semanas
+        self.variacao = variacao(valores)
+        self.variacao_totais = variacao(totais)
+
+    def rotulos(self):
+        return rotulos_semana(self.semanas)
+
+    def como_dataframe(self):
+        # Dias da semana x rótulos das semanas, com a linha TOTAL no fim
+        return pd.DataFrame(np.vstack([self.valores, self.totais]), index=DIAS_SEMANA + ["TOTAL"], columns=self.rotulos())
+
+
+def comparativo_semanas(df_sem):
+    semanas, coluna = np.unique(df_sem["SEMANA"].to_numpy(dtype=np.int64), return_inverse=True)
+    dia = df_sem["DIA_SEMANA"].to_numpy(dtype=np.int64)
+
+    total = np.zeros((len(DIAS_SEMANA), len(semanas)))
+    qtd = np.zeros((len(DIAS_SEMANA), len(semanas)))
+    np.add.at(total, (dia, coluna), df_sem["TOTAL"].to_numpy(dtype=float))
+    np.add.at(qtd, (dia, coluna), df_sem["QTD_VENDAS"].to_numpy(dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ticket = np.where(qtd > 0, total / qtd, 0.0)
+
+    # Média do ticket só entre os dias da semana que tiveram venda no período
+    presentes = qtd.sum(axis=1) > 0
+    ticket_medio = ticket[presentes].mean(axis=0) if presentes.any() else np.zeros(len(semanas))
+
+    return {
+        "TOTAL": Comparativo(total, total.sum(axis=0), semanas),
+        "QTD_VENDAS": Comparativo(qtd, qtd.sum(axis=0), semanas),
+        "TICKET": Comparativo(ticket, ticket_medio, semanas),
+    }
@@ -0,0 +1,102 @@
+import json
+import os
+from contextlib import contextmanager
+
+import pyarrow.feather as feather
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (um processo por máquina)
+    fcntl = None
+
+#====================================================================================================================================
+# SNAPSHOT LOCAL (FEATHER)
+# Guarda os DataFrames já limpos e tipados em disco, sem compressão para permitir
+# leitura memory-mapped na partida. O metadata.json registra hora da carga,
+# quantidade de linhas e watermark, para a carga incremental continuar de onde parou.
+# O diretório também é o cache compartilhado pelos processos do Streamlit na mesma máquina:
+# a trava (arquivo .lock, flock) deixa um processo por vez carregar do banco, e a "geracao"
+# no metadata.json numera as cargas para que todos saibam qual é a mais nova.
+# A leitura não copia: cada coluna do DataFrame aponta direto para o arquivo mapeado
+# (split_blocks), somente leitura e compartilhada pelo cache de páginas do sistema entre
+# todos os processos. No Linux/macOS o os.replace de uma carga nova só troca o nome: quem ainda
+# usa o mapeamento antigo segue lendo o arquivo anterior até soltá-lo. No Windows (sem fcntl) um
+# arquivo mapeado não pode ser substituído, então lá a leitura copia os dados para a memória.
+
+ARQ_VENDAS = "vendas.feather"
+ARQ_METAS = "metas.feather"
+ARQ_INFO = "metadata.json"
+ARQ_TRAVA = ".lock"
+
+
+@contextmanager
+def trava(diretorio, exclusiva=True):
+    # Exclusiva para carregar/gravar, compartilhada para ler; sem diretório não trava nada
+    if not diretorio or fcntl is None:
+        yield
+        return
+    os.makedirs(diretorio, exist_ok=True)
+    with open(os.path.join(diretorio, ARQ_TRAVA), "a") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def geracao_snapshot(diretorio):
+    # Só o metadata.json: barato o bastante para ser consultado a cada poucos segundos
+    try:
+        with open(os.path.join(diretorio, ARQ_INFO), encoding="utf-8") as f:
+            return int(json.load(f).get("geracao", 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def _substituir(caminho, escrever):
+    # Escreve num temporário e troca de uma vez: quem lê nunca vê arquivo pela metade
+    tmp = caminho + ".tmp"
+    escrever(tmp)
+    os.replace(tmp, caminho)
+
+
+def salvar_snapshot(diretorio, vendas, metas, info):
+    os.makedirs(diretorio, exist_ok=True)
+    _substituir(os.path.join(diretorio, ARQ_VENDAS),
+                lambda p: feather.write_feather(vendas, p, compression="uncompressed"))
+    _substituir(os.path.join(diretorio, ARQ_METAS),
+                lambda p: feather.write_feather(metas, p, compression="uncompressed"))
+
+    def escrever_info(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2, default=str)
+    # metadata por último: só aponta para arquivos já completos
+    _substituir(os.path.join(diretorio, ARQ_INFO), escrever_info)
+
+
+def mapeia_memoria():
+    return fcntl is not None
+
+
+def _ler_tabela(caminho):
+    if not mapeia_memoria():
+        return feather.read_table(caminho, memory_map=False).to_pandas()
+    # Um bloco por coluna, sem consolidar: os arrays do pandas ficam sobre a memória do Arrow
+    return feather.read_table(caminho, memory_map=True).to_pandas(split_blocks=True)
+
+
+def ler_snapshot(diretorio):
+    caminho_info = os.path.join(diretorio, ARQ_INFO)
+    if not os.path.exists(caminho_info):
+        return None
+    try:
+        with open(caminho_info, encoding="utf-8") as f:
+            info = json.load(f)
+        vendas = _ler_tabela(os.path.join(diretorio, ARQ_VENDAS))
+        metas = _ler_tabela(os.path.join(diretorio, ARQ_METAS))
+    except Exception:
+        # Snapshot corrompido ou de outra versão: segue com carga completa do banco
+        return None
+    if len(vendas) != info.get("linhas"):
+        return None
+    return vendas, metas, info
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+#====================================================================================================================================
+# TABELAS HTML
+# Comparativos (linhas x semanas) renderizados de uma vez a partir das matrizes de valores e de
+# variações: a formatação é feita por array e cada célula só recebe uma classe CSS (definidas no
+# bloco de CSS do app.py, prefixo .pq-comparativo) em vez do estilo inline repetido.
+
+_BR = str.maketrans(",.", ".,")
+
+
+def formatar_moeda(valores):
+    valores = np.asarray(valores, dtype=float)
+    textos = "R$ " + pd.Series(valores.ravel()).map("{:,.2f}".format).str.translate(_BR)
+    return textos.to_numpy(dtype=object).reshape(valores.shape)
+
+
+def formatar_inteiros(valores):
+    valores = np.asarray(valores, dtype=float)
+    textos = pd.Series(np.trunc(valores.ravel()).astype(np.int64)).map("{:,}".format).str.replace(",", ".", regex=False)
+    return textos.to_numpy(dtype=object).reshape(valores.shape)
+
+
+def formatar_variacao(variacao):
+    # "+12.34%"; vazio onde não há variação (NaN)
+    variacao = np.asarray(variacao, dtype=float)
+    serie = pd.Series(variacao.ravel())
+    textos = serie.map("{:+.2%}".format).where(serie.notna(), "")
+    return textos.to_numpy(dtype=object).reshape(variacao.shape)
+
+
+def tabela_comparativo_html(linhas, colunas, valores, variacao, totais, variacao_totais, inteiro=False):
+    # Linha TOTAL no fim; células verdes (variação >= 0), vermelhas (< 0) ou neutras (sem base)
+    valores = np.vstack([valores, totais])
+    variacao = np.vstack([variacao, variacao_totais])
+    tem_variacao = ~np.isnan(variacao)
+
+    textos = formatar_inteiros(valores) if inteiro else formatar_moeda(valores)
+    sentido = np.where(variacao > 0, "sobe", "desce").astype(object)
+    detalhe = np.where(tem_variacao, "<br><span class='" + sentido + "'>" + formatar_variacao(variacao) + "</span>", "")
+    classe = np.where(~tem_variacao, "nd", np.where(variacao >= 0, "alta", "baixa")).astype(object)
+    celulas = "<td class='" + classe + "'>" + textos + detalhe + "</td>"
+
+    linhas = [f"<tr><td class='linha'>{nome}</td>" for nome in linhas] + ["<tr class='total'><td class='linha'>TOTAL</td>"]
+    corpo = "".join(inicio + "".join(celulas[i]) + "</tr>" for i, inicio in enumerate(linhas))
+    cabecalho = "".join(f"<th>{col}</th>" for col in colunas)
+    return (
+        f"<table class='pq-comparativo'><thead><tr><th>DIA_SEMANA</th>{cabecalho}</tr></thead>"
+        f"<tbody>{corpo}</tbody></table>"
+    )
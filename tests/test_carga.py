@@ -0,0 +1,38 @@
+import pandas as pd
+
+from carga import converter_datas, preparar_metas, resumo_invalidas
+
+
+def test_converter_datas_nulo_vira_nat():
+    datas, invalidas = converter_datas(pd.Series(["01/02/2026", None, "03/02/2026"]))
+    assert invalidas == 1
+    assert pd.isna(datas[1])
+    assert datas[0] == pd.Timestamp("2026-02-01")
+    assert datas[2] == pd.Timestamp("2026-02-03")
+
+
+def test_converter_datas_com_formato():
+    datas, invalidas = converter_datas(pd.Series(["01/02/2026", None, "xx"]), "%d/%m/%Y")
+    assert invalidas == 2
+    assert datas[0] == pd.Timestamp("2026-02-01")
+
+
+def test_preparar_metas_mes_antes_do_dia():
+    metas = preparar_metas(pd.DataFrame({"LOJA": ["A", "A"], "ANO-MES": ["2026-10-01", "2026-11-01"], "VALOR_META": [1, 2]}))
+    assert metas["MES"].tolist() == [2026 * 12 + 10, 2026 * 12 + 11]
+
+
+def test_resumo_invalidas_relidas_nao_contam_duas_vezes():
+    anterior = resumo_invalidas(pd.Series([5, 12], dtype=object), 10)
+    assert anterior == {"linhas": 2, "relidas": 1, "menor": 5, "maior": 12}
+    # A carga incremental relê a faixa >= 10 e encontra de novo a linha 12, mais a 15
+    resumo = resumo_invalidas(pd.Series([12, 15], dtype=object), 20, anterior)
+    assert resumo == {"linhas": 3, "relidas": 0, "menor": 5, "maior": 15}
+
+
+def test_resumo_invalidas_sem_watermark_e_lote_sem_invalidas():
+    # Linha descartada com COD_VENDA nulo: conta, mas não tem menor/maior
+    anterior = resumo_invalidas(pd.Series([None], dtype=object), 10)
+    assert anterior == {"linhas": 1, "relidas": 0, "menor": None, "maior": None}
+    resumo = resumo_invalidas(pd.Series([], dtype=object), 11, anterior)
+    assert resumo == {"linhas": 1, "relidas": 0, "menor": None, "maior": None}
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+import consultas
+
+VENDAS = [
+    # DATA, HORA, UN, COD_VENDA, DESCRICAO_PRODUTO, TOTAL
+    ("2026-01-05", 9, "PQ SUL", 1, "PAO", 10.0),
+    ("2026-01-05", 9, "PQ SUL", 1, "CAFE", 5.0),
+    ("2026-01-05", 11, "PQ SUL", 2, "PAO", 10.0),
+    ("2026-01-06", 8, "PQ SUL", 3, "PAO", 10.0),
+    ("2026-01-06", 8, "PQ SUL", 3, "BOLO", 30.0),
+    ("2026-01-06", 8, "PQ SUL", 4, "CAFE", 5.0),
+    ("2026-01-07", 10, "PQ NORTE", 5, "PAO", 10.0),
+    ("2026-01-07", 10, "PQ NORTE", 5, "CAFE", 5.0),
+    ("2026-01-07", 10, "PQ NORTE", 5, "SUCO", 7.0),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE PQ_VENDAS (DATA TEXT, HORA INTEGER, UN TEXT, COD_VENDA INTEGER, "
+                  "DESCRICAO_PRODUTO TEXT, TOTAL REAL)")
+    # Fora da ordem de DATA: a ordenação tem de vir da consulta
+    conn.executemany("INSERT INTO PQ_VENDAS VALUES (?, ?, ?, ?, ?, ?)", VENDAS[::-1][3:] + VENDAS[::-1][:3])
+    yield conn
+    conn.close()
+
+
+def consultar(conn, nome, *args, **kwargs):
+    return getattr(consultas, nome)(conn, "2026-01-01", "2026-01-31", ("PQ SUL", "PQ NORTE"), *args,
+                                    dialeto="sqlite", **kwargs)
+
+
+def test_detalhe_ultimas_vendas_primeiro(conn):
+    df = consultar(conn, "detalhe", limite=4)
+    assert df["COD_VENDA"].tolist() == [5, 5, 5, 4]
+    df = consultar(conn, "detalhe")
+    chave = list(zip(df["DATA"], df["HORA"], df["COD_VENDA"]))
+    assert chave == sorted(chave, reverse=True)
+    assert len(df) == len(VENDAS)
+
+
+def test_detalhe_desempata_pela_hora_no_mesmo_dia(conn):
+    df = consultas.detalhe(conn, "2026-01-05", "2026-01-05", ("PQ SUL",), limite=1, dialeto="sqlite")
+    assert df["COD_VENDA"].tolist() == [2]
+
+
+def test_totais_produto_por_faturamento(conn):
+    df = consultar(conn, "totais_produto", n=3)
+    assert df["DESCRICAO_PRODUTO"].tolist() == ["PAO", "BOLO", "CAFE"]
+    assert df["TOTAL"].tolist() == [40.0, 30.0, 15.0]
+
+
+def test_produtos_associados_por_frequencia(conn):
+    freq, vendas_produto, total_vendas = consultar(conn, "produtos_associados", "PAO", n=2)
+    assert (vendas_produto, total_vendas) == (4, 5)
+    assert freq["PRODUTO"].tolist()[0] == "CAFE"
+    assert freq["FREQ"].tolist() == sorted(freq["FREQ"].tolist(), reverse=True)
+
+
+def test_detalhe_mssql_ordena_pelo_dia_convertido(monkeypatch):
+    enviadas = []
+    monkeypatch.setattr(consultas, "_ler", lambda conn, sql, params=None: enviadas.append(sql))
+    consultas.detalhe(None, "2026-01-01", "2026-01-31", ("PQ SUL",), limite=10, dialeto="mssql")
+    sql = " ".join(enviadas[0].split())
+    assert sql.startswith("SELECT TOP 10 *")
+    assert f"ORDER BY {consultas.dialeto_mssql()['dia']} DESC, HORA DESC, COD_VENDA DESC" in sql
@@ -0,0 +1,36 @@
+import io
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from relatorio import _nome_aba, montar_relatorio
+from semana import comparativo_semanas
+
+LONGA = "PAO QUENTE SHOPPING CENTER NORTE"
+
+
+def test_nome_aba_encurta_so_a_loja():
+    usados = set()
+    nomes = [_nome_aba(LONGA, metrica, usados) for metrica in ("Hora", "Faturamento", "Qtd Vendas", "Ticket Médio")]
+    assert all(len(nome) <= 31 for nome in nomes)
+    assert [nome.split(" - ")[-1] for nome in nomes] == ["Hora", "Faturamento", "Qtd Vendas", "Ticket Médio"]
+    assert len(set(nomes)) == 4
+
+
+def test_nome_aba_lojas_iguais_depois_do_corte():
+    usados = set()
+    a = _nome_aba(LONGA, "Faturamento", usados)
+    b = _nome_aba(LONGA + " II", "Faturamento", usados)
+    c = _nome_aba("pao quente/shopping", "Hora", usados)
+    assert a != b and len(b) <= 31 and b.endswith(" 2 - Faturamento")
+    assert c == "pao quente-shopping - Hora"
+
+
+def test_relatorio_abas_distintas_com_metrica():
+    df_hora = pd.DataFrame({"HORA_STR": ["08h"], "TOTAL": [10.0], "COD_VENDA": [2], "TICKET_MEDIO": [5.0]})
+    comparativos = comparativo_semanas(pd.DataFrame({"SEMANA": [20000], "DIA_SEMANA": [0], "TOTAL": [10.0], "QTD_VENDAS": [2]}))
+    resultados = [(un, df_hora, comparativos) for un in (LONGA, LONGA + " II")]
+    abas = load_workbook(io.BytesIO(montar_relatorio(resultados)), read_only=True).sheetnames
+    assert len(abas) == 8 and len({aba.lower() for aba in abas}) == 8
+    assert all(len(aba) <= 31 for aba in abas)
+    assert sum(aba.endswith(" - Ticket Médio") for aba in abas) == 2
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+import snapshot
+from carga import BaseVendas
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE PQ_VENDAS (DATA TEXT, HORA INTEGER, UN TEXT, COD_VENDA INTEGER, "
+                 "DESCRICAO_PRODUTO TEXT, TOTAL REAL)")
+    conn.execute('CREATE TABLE PQ_METAS (LOJA TEXT, "ANO-MES" TEXT, VALOR_META REAL)')
+    conn.executemany("INSERT INTO PQ_VENDAS VALUES (?, ?, ?, ?, ?, ?)", [
+        ("05/01/2026", 9, "PQ SUL", 1, "PAO", 10.0),
+        ("06/01/2026", 10, "PQ SUL", 2, "CAFE", 5.0),
+    ])
+    conn.execute("INSERT INTO PQ_METAS VALUES ('PQ SUL', '2026-01-01', 100.0)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def nova_venda(conn, cod):
+    conn.execute("INSERT INTO PQ_VENDAS VALUES ('07/01/2026', 11, 'PQ SUL', ?, 'PAO', 10.0)", (cod,))
+    conn.commit()
+
+
+def test_carga_serve_o_snapshot_mapeado_somente_leitura(conn, tmp_path):
+    base = BaseVendas(dir_snapshot=str(tmp_path))
+    vendas, _, _ = base.atualizar(conn)
+    assert not vendas["TOTAL"].to_numpy().flags.writeable
+    nova_venda(conn, 3)
+    novas, _, versao = base.atualizar(conn)
+    assert versao == 2 and len(novas) == 3 and len(vendas) == 2
+
+
+def test_sem_fcntl_le_sem_mapear_e_substitui_o_arquivo(conn, tmp_path, monkeypatch):
+    # Windows: arquivo mapeado não pode ser trocado; os dados ficam em memória
+    monkeypatch.setattr(snapshot, "fcntl", None)
+    base = BaseVendas(dir_snapshot=str(tmp_path))
+    vendas, _, _ = base.atualizar(conn)
+    assert vendas["TOTAL"].to_numpy().flags.writeable
+    nova_venda(conn, 3)
+    novas, _, versao = base.atualizar(conn)
+    assert versao == 2 and len(novas) == 3
+    restaurada = BaseVendas(dir_snapshot=str(tmp_path))
+    assert restaurada.restaurar_snapshot() and len(restaurada.vendas) == 3
+    assert restaurada.vendas["TOTAL"].to_numpy().flags.writeable